@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 import aiomysql
 
+from metrics import Gauge, STAGE_SECONDS
+
 load_dotenv()
 
 MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
@@ -27,24 +29,44 @@ async def _get_pool():
         )
     return _pool
 
+# Connections by state, for /metrics and readiness checks
+def pool_stats():
+    if _pool is None:
+        return {"max": 10, "size": 0, "free": 0, "in_use": 0}
+    return {
+        "max": _pool.maxsize,
+        "size": _pool.size,
+        "free": _pool.freesize,
+        "in_use": _pool.size - _pool.freesize
+    }
+
+Gauge(
+    "db_pool_connections",
+    "MySQL pool connections by state (max, size, free, in_use)",
+    ["state"],
+    collect=lambda: {(state,): n for state, n in pool_stats().items()}
+)
+
 async def fetch_menu(branch: int):
-    pool = await _get_pool()
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute(
-                "SELECT name, category, portion, price FROM menu WHERE branch=%s",
-                (branch,)
-            )
-            rows = await cur.fetchall()
-            return [dict(r) for r in rows]
+    with STAGE_SECONDS.time("db_menu_fetch"):
+        pool = await _get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(
+                    "SELECT name, category, portion, price FROM menu WHERE branch=%s",
+                    (branch,)
+                )
+                rows = await cur.fetchall()
+                return [dict(r) for r in rows]
 
 async def fetch_recent_orders(branch: int, days: int = 30):
-    pool = await _get_pool()
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT item_name, COUNT(*) as cnt FROM orders WHERE branch=%s AND order_date >= NOW() - INTERVAL %s DAY GROUP BY item_name",
-                (branch, days)
-            )
-            rows = await cur.fetchall()
-            return {row[0]: int(row[1]) for row in rows}
+    with STAGE_SECONDS.time("db_popularity_fetch"):
+        pool = await _get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT item_name, COUNT(*) as cnt FROM orders WHERE branch=%s AND order_date >= NOW() - INTERVAL %s DAY GROUP BY item_name",
+                    (branch, days)
+                )
+                rows = await cur.fetchall()
+                return {row[0]: int(row[1]) for row in rows}
@@ -0,0 +1,89 @@
+import os
+import re
+import json
+import time
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Minimal stand-in for the Groq chat completions API, for local testing:
+#   uvicorn fake_llm:app --port 9000
+#   GROQ_BASE_URL=http://localhost:9000 GROQ_API_KEY=fake uvicorn main:app --port 8003
+FAKE_LLM_DELAY = float(os.getenv("FAKE_LLM_DELAY", 0.3))
+# streaming: characters per chunk, and cut the output after this many
+# characters (0 = never) to simulate truncated completions
+FAKE_LLM_CHUNK = int(os.getenv("FAKE_LLM_CHUNK", 16))
+FAKE_LLM_TRUNCATE = int(os.getenv("FAKE_LLM_TRUNCATE", 0))
+
+app = FastAPI(title="Fake LLM")
+
+# menu rows as written by build_prompt: name|category|portion|price|recent_orders
+MENU_LINE = re.compile(r"^(?P<name>[^|]+)\|(?P<category>[^|]*)\|(?P<portion>[^|]*)\|(?P<price>\d+)\|\d+$")
+
+def fake_suggestions(prompt: str):
+    suggestions = []
+    for line in prompt.splitlines():
+        m = MENU_LINE.match(line.strip())
+        if not m:
+            continue
+        suggestions.append({
+            "name": m["name"],
+            "category": m["category"],
+            "portion": m["portion"],
+            "price": int(m["price"]),
+            "reason": "Fake LLM pick"
+        })
+        if len(suggestions) == 3:
+            break
+    return suggestions
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    if not body.get("stream"):
+        await asyncio.sleep(FAKE_LLM_DELAY)
+
+    content = json.dumps({"suggestions": fake_suggestions(prompt)})
+    if FAKE_LLM_TRUNCATE:
+        content = content[:FAKE_LLM_TRUNCATE]
+
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(body, content), media_type="text/event-stream")
+
+    return {
+        "id": "fake-completion",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4}
+    }
+
+async def stream_chunks(body, content):
+    chunk_delay = FAKE_LLM_DELAY / max(1, len(content) // FAKE_LLM_CHUNK)
+    for i in range(0, len(content), FAKE_LLM_CHUNK):
+        await asyncio.sleep(chunk_delay)
+        last = i + FAKE_LLM_CHUNK >= len(content)
+        # a truncated completion ends like one that hit max_tokens
+        finish_reason = ("length" if FAKE_LLM_TRUNCATE else "stop") if last else None
+        chunk = {
+            "id": "fake-completion",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "delta": {"content": content[i:i + FAKE_LLM_CHUNK]}, "finish_reason": finish_reason}]
+        }
+        if last:
+            # Groq puts the token counts on the final chunk
+            chunk["x_groq"] = {"id": "fake", "usage": {
+                "prompt_tokens": len(body["messages"][-1]["content"]) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(body["messages"][-1]["content"]) + len(content)) // 4
+            }}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+import logging
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from database import _get_pool, pool_stats
+from redis_cache import redis_client
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Per-dependency timeout for a readiness check
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", 0.5))
+# Probes within this many seconds of a check reuse its result
+READY_CACHE_TTL = float(os.getenv("READY_CACHE_TTL", 1.0))
+
+# Checks that must pass to be ready. A Redis failure only costs cache
+# hits here (menus fall back to MySQL), so it is reported but not required
+REQUIRED_CHECKS = ("mysql",)
+
+_last = None            # (checked_at, ready, body)
+_lock = asyncio.Lock()
+
+async def _check_mysql():
+    stats = pool_stats()
+    if stats["size"] >= stats["max"] and stats["free"] == 0:
+        # every connection is busy, so MySQL is answering; waiting for
+        # one would only make the probe time out under load
+        return "saturated"
+    pool = await _get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT 1")
+    return "ok"
+
+async def _check_redis():
+    await redis_client.ping()
+    return "ok"
+
+async def _run(check):
+    try:
+        return await asyncio.wait_for(check(), READY_TIMEOUT)
+    except Exception as e:
+        return f"error: {e!r}"
+
+async def _readiness():
+    mysql, redis = await asyncio.gather(_run(_check_mysql), _run(_check_redis))
+    checks = {"mysql": mysql, "redis": redis}
+
+    stats = pool_stats()
+    saturation = stats["in_use"] / stats["max"] if stats["max"] else 0.0
+
+    failed = [name for name in REQUIRED_CHECKS if checks[name] not in ("ok", "saturated")]
+    if failed:
+        logger.warning("not ready: failed=%s", failed)
+
+    return not failed, {
+        "status": "not_ready" if failed else "ready",
+        "checks": checks,
+        "pool": {**stats, "saturation": round(saturation, 3)}
+    }
+
+# Liveness: the process is up and serving its event loop. Never touches
+# MySQL or Redis, so a dependency outage doesn't get instances restarted
+@router.get("/health")
+@router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+# Readiness: whether to route traffic here. 503 while a required
+# dependency is unreachable
+@router.get("/health/ready")
+async def readiness():
+    global _last
+    async with _lock:
+        if _last is None or time.monotonic() - _last[0] >= READY_CACHE_TTL:
+            ready, body = await _readiness()
+            _last = (time.monotonic(), ready, body)
+        _, ready, body = _last
+    return JSONResponse(body, status_code=200 if ready else 503)
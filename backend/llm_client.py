@@ -0,0 +1,145 @@
+import os
+import json
+import random
+import time
+import hashlib
+import asyncio
+import logging
+from dotenv import load_dotenv
+import httpx
+from groq import (
+    AsyncGroq,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+from redis_cache import get_llm_response_from_cache, store_llm_response_in_cache
+from metrics import CACHE_REQUESTS, STAGE_SECONDS
+
+load_dotenv()
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Point at a local fake server (see fake_llm.py) for testing
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 15))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", 0.5))
+
+# Failures worth another attempt; anything else (bad request, auth) is not
+RETRYABLE = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError, asyncio.TimeoutError)
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_semaphore = None
+
+def get_client():
+    # One AsyncGroq per process over a keep-alive connection pool.
+    # Retries are done here, not in the SDK, so they respect the semaphore
+    global _client, _semaphore
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONCURRENCY,
+                max_keepalive_connections=LLM_MAX_CONCURRENCY
+            ),
+            timeout=LLM_TIMEOUT
+        )
+        _client = AsyncGroq(
+            api_key=GROQ_API_KEY,
+            base_url=GROQ_BASE_URL,
+            http_client=http_client,
+            max_retries=0
+        )
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _client
+
+async def close_client():
+    global _client, _semaphore
+    if _client is not None:
+        await _client.close()
+        _client = None
+        _semaphore = None
+
+def prompt_hash(params):
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+# Caller must hold _semaphore
+async def _create_with_retries(params):
+    client = get_client()
+    for attempt in range(LLM_RETRIES + 1):
+        try:
+            return await asyncio.wait_for(client.chat.completions.create(**params), LLM_TIMEOUT)
+        except RETRYABLE as e:
+            if attempt == LLM_RETRIES:
+                raise
+            delay = LLM_BACKOFF * (2 ** attempt) * (1 + random.random())
+            logger.warning("LLM call failed (%s), retrying in %.2fs", e, delay)
+            await asyncio.sleep(delay)
+
+# Groq reports token counts on the last chunk of a stream, under x_groq
+# (or as usage, for OpenAI-style include_usage streams)
+def _chunk_usage(chunk):
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
+
+# Completion text for a prompt, yielded as it is generated, or at once
+# from the prompt-hash cache. Only the request itself is retried; once
+# chunks flow, a failure ends the stream (callers keep what they already
+# got). Only complete texts are cached
+async def stream_complete(model, messages, **kwargs):
+    params = {"model": model, "messages": messages, **kwargs}
+    key = prompt_hash(params)
+
+    cached = await get_llm_response_from_cache(key)
+    if cached is not None:
+        CACHE_REQUESTS.inc("llm", "hit")
+        yield cached
+        return
+    CACHE_REQUESTS.inc("llm", "miss")
+
+    get_client()
+    async with _semaphore:
+        start = time.perf_counter()
+        stream = await _create_with_retries({**params, "stream": True})
+        STAGE_SECONDS.observe(time.perf_counter() - start, "llm_first_response")
+        parts = []
+        finish_reason = None
+        usage = None
+        try:
+            iterator = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), LLM_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                usage = _chunk_usage(chunk) or usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await stream.close()
+            STAGE_SECONDS.observe(time.perf_counter() - start, "llm_call")
+            if usage is not None:
+                logger.info(
+                    "LLM usage: %d prompt tokens, %d completion tokens",
+                    usage.prompt_tokens, usage.completion_tokens
+                )
+
+    # a stream can end cleanly and still be cut short ("length" when
+    # max_tokens is hit, nothing at all when the connection drops)
+    if finish_reason == "stop":
+        await store_llm_response_in_cache(key, "".join(parts))
+    else:
+        logger.warning("LLM stream ended with finish_reason=%s, not caching", finish_reason)
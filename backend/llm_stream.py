@@ -0,0 +1,67 @@
+import json
+
+# Incremental parser for LLM output shaped like
+#   {"branch": 1, "suggestions": [{...}, {...}, {...}]}
+# feed() takes raw text chunks and returns each suggestion object as soon
+# as its closing brace arrives, so callers never wait for (or depend on)
+# the rest of the document. Text around the JSON, such as markdown fences,
+# is ignored.
+class SuggestionStreamParser:
+    def __init__(self):
+        self.buffer = []
+        self.stack = []          # open containers: "{" or "["
+        self.in_string = False
+        self.escaped = False
+        self.start = None        # buffer position where the current suggestion began
+        self.pos = 0
+
+    def feed(self, chunk: str):
+        done = []
+        for ch in chunk:
+            self.buffer.append(ch)
+            self.pos += 1
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                # an object directly inside the root object's array
+                if ch == "{" and self.stack == ["{", "["]:
+                    self.start = self.pos - 1
+                self.stack.append(ch)
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if ch == "}" and self.start is not None and self.stack == ["{", "["]:
+                    text = "".join(self.buffer[self.start:self.pos])
+                    self.start = None
+                    try:
+                        done.append(json.loads(text))
+                    except ValueError:
+                        pass
+        return done
+
+# Checks a suggestion against the branch menu. Returns the cleaned
+# suggestion, or None if the item isn't on the menu. Category, portion
+# and price always come from the menu, never from the model
+def validate_suggestion(s, menu_by_name):
+    if not isinstance(s, dict):
+        return None
+    item = menu_by_name.get(str(s.get("name", "")).strip().lower())
+    if item is None:
+        return None
+    return {
+        "name": item["name"],
+        "category": item["category"],
+        "portion": item["portion"],
+        "price": int(item["price"]),
+        "reason": str(s.get("reason", ""))
+    }
@@ -0,0 +1,130 @@
+import os
+
+# Same keyword scoring and budget rules as the local recommender
+# (backend_v3.0/recommend_local.py), used here to shortlist menu items
+# before they go into the LLM prompt
+
+MOOD_KEYWORDS = {
+    "spicy_craving": ["spicy", "hot"],
+    "cheesy_mood": ["cheese", "cheesy"],
+    "sweet_craving": ["sweet", "dessert", "cake", "brownie"],
+    "healthy_choice": ["salad", "grill", "low fat"],
+    "heavy_meal": ["karahi", "biryani", "handi", "qorma"],
+    "light_meal": ["soup", "salad", "fries"]
+}
+
+SPICE_LEVELS = {
+    "low": ["mild", "light"],
+    "medium": ["regular", "medium"],
+    "high": ["hot", "spicy"]
+}
+
+# Max menu rows sent to the LLM
+PROMPT_SHORTLIST = int(os.getenv("PROMPT_SHORTLIST", 20))
+
+def get_budget_range(peoples, budget, mood):
+    if peoples == 1:
+        base = 600
+    elif peoples == 2:
+        base = 1200
+    elif peoples == 3:
+        base = 1800
+    elif peoples == 4:
+        base = 2500
+    elif peoples == 5:
+        base = 3200
+    else:
+        base = peoples * 600
+
+    if budget == "tight":
+        base *= 1.0
+    elif budget == "medium":
+        base *= 1.4
+    elif budget == "comfortable":
+        base *= 1.8
+
+    mood_factor = {
+        "spicy_craving": 1.3,
+        "cheesy_mood": 1.3,
+        "sweet_craving": 1.1,
+        "healthy_choice": 0.9,
+        "heavy_meal": 1.5,
+        "light_meal": 0.8
+    }
+
+    factor = mood_factor.get(mood, 1.0)
+    final = base * factor
+
+    return int(final * 0.7), int(final), int(final * 1.3)
+
+def keyword_hits(name_lower, keywords):
+    return {key for key, words in keywords.items() if any(w in name_lower for w in words)}
+
+# Per-branch data that doesn't depend on the question: lowercased names,
+# mood/spice hits and the prompt row of every item
+class MenuPromptIndex:
+    def __init__(self, menu):
+        self.menu = menu
+        self.names_lower = [m["name"].lower() for m in menu]
+        self.moods = [keyword_hits(n, MOOD_KEYWORDS) for n in self.names_lower]
+        self.spices = [keyword_hits(n, SPICE_LEVELS) for n in self.names_lower]
+        # lowercased name -> menu item, for validating LLM suggestions
+        self.by_name = {}
+        for n, m in zip(self.names_lower, menu):
+            self.by_name.setdefault(n.strip(), m)
+        self.rows = [f"{m['name']}|{m['category']}|{m['portion']}|{m['price']}" for m in menu]
+        # rough size of the old full-menu prompt, for the savings log
+        self.full_menu_tokens = sum(len(r) + 20 for r in self.rows) // 4
+
+_prompt_indexes = {}
+
+def get_prompt_index(branch: int, menu):
+    cached = _prompt_indexes.get(branch)
+    if cached is not None and cached.menu == menu:
+        return cached
+    index = MenuPromptIndex(menu)
+    _prompt_indexes[branch] = index
+    return index
+
+# Positions of up to `limit` items: avoided items and items the group
+# can't afford one each of are dropped, the rest ranked by score and
+# taken round-robin across categories so every category stays represented
+def shortlist(index: MenuPromptIndex, q, recent, limit=PROMPT_SHORTLIST):
+    _, _, hard_budget = get_budget_range(q.peoples, q.budget, q.mood)
+    avoid = q.avoid_anything.lower()
+
+    by_category = {}
+    for i, m in enumerate(index.menu):
+        if avoid and avoid in index.names_lower[i]:
+            continue
+        if m["price"] * q.peoples > hard_budget:
+            continue
+        score = (
+            (q.mood in index.moods[i]) * 2 +
+            (q.spice_lvl in index.spices[i]) * 3 +
+            recent.get(m["name"], 0)
+        )
+        by_category.setdefault(m["category"], []).append((-score, i))
+
+    queues = [sorted(items) for items in by_category.values()]
+    queues.sort(key=lambda items: items[0])
+
+    picked = []
+    depth = 0
+    while len(picked) < limit and any(depth < len(items) for items in queues):
+        for items in queues:
+            if depth < len(items) and len(picked) < limit:
+                picked.append(items[depth][1])
+        depth += 1
+    return picked
+
+# Short human-readable reason for a locally picked item
+def local_reason(index: MenuPromptIndex, i: int, q, recent):
+    reasons = []
+    if q.mood in index.moods[i]:
+        reasons.append("matches your mood")
+    if q.spice_lvl in index.spices[i]:
+        reasons.append("right spice level")
+    if recent.get(index.menu[i]["name"], 0):
+        reasons.append("popular lately")
+    return ", ".join(reasons).capitalize() if reasons else "Fits your budget"
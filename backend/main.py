@@ -1,15 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from recommend_groq import router as recommend_router
+from llm_client import close_client
+from metrics import MetricsMiddleware, router as metrics_router
+from health import router as health_router
 
-app = FastAPI(title="Restaurant Recommender Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_client()
+
+app = FastAPI(title="Restaurant Recommender Backend", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 app.include_router(recommend_router, prefix="/api")
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
 
 @app.get("/")
 async def root():
     return {"message": "Restaurant Recommender Backend is running!"}
-
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
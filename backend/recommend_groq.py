@@ -1,13 +1,19 @@
 import os
 import json
+import logging
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from groq import Groq
 import asyncio
+from contextlib import aclosing
 
 from redis_cache import get_menu_from_cache, store_menu_in_cache
 from database import fetch_menu, fetch_recent_orders
+from llm_client import stream_complete
+from llm_stream import SuggestionStreamParser, validate_suggestion
+from local_scorer import get_prompt_index, shortlist, local_reason
+from metrics import CACHE_REQUESTS, STAGE_SECONDS
 
 load_dotenv()
 
@@ -17,8 +23,18 @@ MODEL = os.getenv("MODEL", "llama3.1-8b-instant")
 if not GROQ_API_KEY:
     raise RuntimeError("GROQ_API_KEY is not set")
 
-client = Groq(api_key=GROQ_API_KEY)
+# Per-source timeouts (seconds) for the data-loading phase
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", 0.2))
+MENU_TIMEOUT = float(os.getenv("MENU_TIMEOUT", 2.0))
+POPULARITY_TIMEOUT = float(os.getenv("POPULARITY_TIMEOUT", 1.0))
+# How long /recommend/hybrid waits for the LLM after sending local picks
+HYBRID_LLM_DEADLINE = float(os.getenv("HYBRID_LLM_DEADLINE", 5.0))
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# keep references to fire-and-forget tasks so they aren't garbage collected
+_background_tasks = set()
 
 class Question(BaseModel):
     peoples: int
@@ -31,88 +47,205 @@ class InputPayload(BaseModel):
     branch: int
     question: Question
 
-def build_prompt(menu, recent, q: Question, branch: int):
-    menu_txt = "\n".join([f"{m['name']} | {m['category']} | {m['portion']} | price:{m['price']}" for m in menu])
-    recent_txt = ", ".join([f"{k}:{v}" for k, v in recent.items()])
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# Redis first, MySQL on a miss; a slow or broken Redis is treated as a miss
+async def load_menu(branch: int):
+    try:
+        with STAGE_SECONDS.time("menu_cache"):
+            menu = await asyncio.wait_for(get_menu_from_cache(branch), CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("menu cache lookup failed for branch %s: %s", branch, e)
+        CACHE_REQUESTS.inc("menu", "error")
+        menu = None
+
+    if menu:
+        CACHE_REQUESTS.inc("menu", "hit")
+        return menu
+    CACHE_REQUESTS.inc("menu", "miss")
+
+    menu = await asyncio.wait_for(fetch_menu(branch), MENU_TIMEOUT)
+    run_in_background(store_menu_in_cache(branch, menu))
+    return menu
+
+# Popularity is only a hint for the model, so on failure we prompt without it
+async def load_popularity(branch: int):
+    try:
+        return await asyncio.wait_for(fetch_recent_orders(branch), POPULARITY_TIMEOUT)
+    except Exception as e:
+        logger.warning("popularity fetch failed for branch %s: %s", branch, e)
+        return {}
 
-    prompt = f"""
-You are a restaurant recommendation assistant.
+# Menu and popularity are independent, so load them concurrently
+async def load_branch_data(branch: int):
+    with STAGE_SECONDS.time("branch_data"):
+        menu, recent = await asyncio.gather(
+            load_menu(branch),
+            load_popularity(branch),
+            return_exceptions=True
+        )
+    if isinstance(menu, BaseException):
+        raise HTTPException(status_code=503, detail=f"Menu unavailable for branch {branch}: {menu!r}")
+    if isinstance(recent, BaseException):
+        recent = {}
+    return menu, recent
 
-Branch: {branch}
-User preferences:
-- people: {q.peoples}
-- mood: {q.mood}
-- spice: {q.spice_lvl}
-- avoid: {q.avoid_anything}
-- budget: {q.budget}
+def estimate_tokens(text: str):
+    # ~4 characters per token for English text
+    return len(text) // 4
 
-Recent popular items: {recent_txt}
+# Menu positions that may go to the model: within budget and not avoided.
+# Empty when nothing qualifies; callers then skip the LLM altogether
+def pick_items(index, q: Question, recent):
+    with STAGE_SECONDS.time("shortlist"):
+        return shortlist(index, q, recent)
 
-Menu:
+def build_prompt(menu, recent, q: Question, branch: int, picked):
+    # Only a shortlist of the menu goes to the model, one compact row per
+    # item with its recent order count instead of a separate popularity list
+    index = get_prompt_index(branch, menu)
+    menu_txt = "\n".join([f"{index.rows[i]}|{recent.get(menu[i]['name'], 0)}" for i in picked])
+
+    prompt = f"""Restaurant recommendation assistant. Branch {branch}.
+Guests: people={q.peoples} mood={q.mood} spice={q.spice_lvl} avoid={q.avoid_anything} budget={q.budget}
+Menu (name|category|portion|price|recent_orders):
 {menu_txt}
+Pick exactly 3 items from the menu. Return ONLY JSON:
+{{"branch":{branch},"suggestions":[{{"name":"<menu item name>","category":"<category>","portion":"<portion>","price":<integer>,"reason":"<short reason>"}}]}}"""
 
-Task:
-Return ONLY valid JSON with exactly 3 suggestions:
-{{
-  "branch": {branch},
-  "suggestions": [
-    {{
-      "name": "<menu item name>",
-      "category": "<category>",
-      "portion": "<portion>",
-      "price": <integer>,
-      "reason": "<short reason>"
-    }}
-  ]
-}}
-"""
+    logger.info(
+        "branch %s prompt: %d/%d menu items, ~%d tokens (full menu ~%d)",
+        branch, len(picked), len(menu), estimate_tokens(prompt), index.full_menu_tokens
+    )
     return prompt
 
+# Streams the completion and yields each suggestion as soon as it is
+# complete and checked against the menu (unknown items and repeats are
+# dropped, at most 3). A stream that breaks off keeps what was yielded
+async def llm_suggestions(prompt: str, index):
+    parser = SuggestionStreamParser()
+    seen = set()
+    chunks = stream_complete(
+        MODEL,
+        [
+            {"role": "system", "content": "JSON only"},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.2,
+        max_tokens=512
+    )
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            for s in parser.feed(chunk):
+                clean = validate_suggestion(s, index.by_name)
+                if clean is None or clean["name"] in seen or len(seen) == 3:
+                    continue
+                seen.add(clean["name"])
+                yield clean
+
 @router.post("/recommend")
 async def recommend_groq(payload: InputPayload):
     branch = payload.branch
     q = payload.question
 
-    menu = await get_menu_from_cache(branch)
-    if not menu:
-        menu = await fetch_menu(branch)
-        await store_menu_in_cache(branch, menu)
-
-    recent = await fetch_recent_orders(branch)
-    prompt = build_prompt(menu, recent, q, branch)
+    menu, recent = await load_branch_data(branch)
+    index = get_prompt_index(branch, menu)
+    picked = pick_items(index, q, recent)
+    if not picked:
+        # nothing on the menu fits the budget and the avoid list
+        return {"branch": branch, "suggestions": []}
+    prompt = build_prompt(menu, recent, q, branch, picked)
 
+    clean = []
     try:
-        loop = asyncio.get_running_loop()
-        resp = await loop.run_in_executor(None, lambda: client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "JSON only"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=512
-        ))
+        async for s in llm_suggestions(prompt, index):
+            clean.append(s)
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Groq API error: {str(e)}")
+        if not clean:
+            raise HTTPException(status_code=502, detail=f"Groq API error: {str(e)}")
+        logger.warning("LLM stream for branch %s broke off after %d suggestions: %s", branch, len(clean), e)
 
-    try:
-        text = resp.choices[0].message["content"]
-        parsed = json.loads(text)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Failed parsing Groq response: {e}")
+    if not clean:
+        raise HTTPException(status_code=502, detail="Groq response had no valid suggestions")
 
-    suggestions = parsed.get("suggestions", [])[:3]
-    clean = []
-    for s in suggestions:
-        clean.append({
-            "name": s.get("name", ""),
-            "category": s.get("category", ""),
-            "portion": s.get("portion", ""),
-            "price": int(s.get("price", 0)),
-            "reason": s.get("reason", "")
+    return {"branch": branch, "suggestions": clean}
+
+def ndjson(event: dict):
+    return json.dumps(event) + "\n"
+
+# Streams NDJSON: first the local picks (no LLM involved), then one
+# "llm_suggestion" event per validated LLM suggestion as it arrives, and
+# finally "llm" with all of them, or "llm_timeout" / "llm_error" if the
+# model can't finish in time. Clients keep showing the local picks
+# unless LLM suggestions arrive
+@router.post("/recommend/hybrid")
+async def recommend_hybrid(payload: InputPayload):
+    branch = payload.branch
+    q = payload.question
+
+    menu, recent = await load_branch_data(branch)
+    index = get_prompt_index(branch, menu)
+    picked = pick_items(index, q, recent)
+
+    # Start the LLM now, so it runs while the local picks are built and
+    # sent. It is a task of its own: past the deadline (or if the client
+    # goes away) it still finishes and fills the prompt cache. With
+    # nothing to pick from, there is no LLM call and no LLM suggestions
+    llm_events = asyncio.Queue()
+
+    async def ask_llm():
+        try:
+            async for s in llm_suggestions(prompt, index):
+                llm_events.put_nowait(s)
+        except Exception as e:
+            llm_events.put_nowait(e)
+        else:
+            llm_events.put_nowait(None)
+
+    if picked:
+        prompt = build_prompt(menu, recent, q, branch, picked)
+        run_in_background(ask_llm())
+    else:
+        llm_events.put_nowait(None)
+
+    local = []
+    for i in picked[:3]:
+        m = menu[i]
+        local.append({
+            "name": m["name"],
+            "category": m["category"],
+            "portion": m["portion"],
+            "price": int(m["price"]),
+            "reason": local_reason(index, i, q, recent)
         })
 
-    return {"branch": branch, "suggestions": clean}
+    async def events():
+        yield ndjson({"type": "local", "branch": branch, "suggestions": local})
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + HYBRID_LLM_DEADLINE
+        suggestions = []
+        while True:
+            try:
+                s = await asyncio.wait_for(llm_events.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                yield ndjson({"type": "llm_timeout", "branch": branch})
+                return
+            if s is None:
+                break
+            if isinstance(s, Exception):
+                logger.warning("hybrid LLM enrichment failed for branch %s: %s", branch, s)
+                yield ndjson({"type": "llm_error", "branch": branch})
+                return
+            suggestions.append(s)
+            yield ndjson({"type": "llm_suggestion", "branch": branch, "suggestion": s})
+        yield ndjson({"type": "llm", "branch": branch, "suggestions": suggestions})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @router.post("/recommendd")
 async def recommend_groq(payload: InputPayload):
@@ -8,6 +8,7 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_TTL = int(os.getenv("REDIS_TTL", 300))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 3600))
 
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
 
@@ -27,3 +28,15 @@ async def store_menu_in_cache(branch: int, menu):
         await redis_client.set(key, json.dumps(menu), ex=REDIS_TTL)
     except Exception:
         pass
+
+async def get_llm_response_from_cache(prompt_hash: str):
+    try:
+        return await redis_client.get(f"llm_{prompt_hash}")
+    except Exception:
+        return None
+
+async def store_llm_response_in_cache(prompt_hash: str, text: str):
+    try:
+        await redis_client.set(f"llm_{prompt_hash}", text, ex=LLM_CACHE_TTL)
+    except Exception:
+        pass
@@ -27,6 +27,17 @@ async def _get_pool():
         )
     return _pool
 
+# Connections by state, for readiness checks
+def pool_stats():
+    if _pool is None:
+        return {"max": 10, "size": 0, "free": 0, "in_use": 0}
+    return {
+        "max": _pool.maxsize,
+        "size": _pool.size,
+        "free": _pool.freesize,
+        "in_use": _pool.size - _pool.freesize
+    }
+
 async def fetch_menu(branch: int):
     pool = await _get_pool()
     async with pool.acquire() as conn:
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from recommend_local import router as recommend_router
+from health import router as health_router
 
 app = FastAPI(
     title="Local Restaurant Recommender",
@@ -7,13 +8,10 @@ app = FastAPI(
 )
 
 app.include_router(recommend_router, prefix="/api")
+app.include_router(health_router)
 
 
 @app.get("/")
 async def root():
     return {"message": "Local Recommendation Backend Running"}
 
-
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
@@ -0,0 +1,44 @@
+import os
+
+# Every cache key lives under one versioned prefix: "<namespace>:<kind>:<id>".
+# Bumping CACHE_NAMESPACE (e.g. for an incompatible value format) starts a
+# fresh keyspace without deleting anything; old keys expire with their TTL
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "rr:v1")
+
+MENU = "menu"
+POPULARITY = "popularity"
+RESPONSE = "response"
+LOCK = "lock"
+POPULARITY_DAILY = "popularity_daily"
+
+
+def cache_key(kind, *parts):
+    return ":".join((CACHE_NAMESPACE, kind) + tuple(str(p) for p in parts))
+
+
+def menu_key(branch):
+    return cache_key(MENU, branch)
+
+
+def popularity_key(branch):
+    return cache_key(POPULARITY, branch)
+
+
+def daily_popularity_key(branch, day):
+    return cache_key(POPULARITY_DAILY, branch, day.isoformat())
+
+
+def lock_key(kind, branch):
+    return cache_key(LOCK, kind, branch)
+
+
+# Names used before the namespace, newest first. Reads fall back to these
+# (in the same round trip) and copy hits under the new name, so a deploy
+# doesn't start with every branch cold. menu_branch_{b} is what v2.0 and
+# the LLM backend write
+def legacy_keys(kind, branch):
+    if kind == MENU:
+        return [f"menu:{branch}", f"menu_branch_{branch}"]
+    if kind == POPULARITY:
+        return [f"popularity:{branch}"]
+    return []
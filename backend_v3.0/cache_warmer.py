@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import time
+
+from database import fetch_all_menus, fetch_menu_versions, init_pool, close_pool
+from local_cache import freeze_menu
+from menu_index import get_menu_index
+from menu_watcher import record_versions
+from redis_cache import LOCAL_MENU_CACHE_SIZE, local_menu_cache, set_many, share_menus
+from scoring_numpy import get_numpy_index, use_numpy
+
+logger = logging.getLogger(__name__)
+
+# (versions, menus) loaded by preload_caches() in a pre-fork master
+_preloaded = None
+
+
+async def _load_menus():
+    # read first, so the recorded stamps are never newer than the menus
+    versions, now = await fetch_menu_versions()
+    menus = {branch: freeze_menu(rows) for branch, rows in (await fetch_all_menus()).items()}
+    return versions, now, menus
+
+
+def _build_indexes(menus):
+    items = 0
+    for branch, menu in menus.items():
+        # keyed by the same menu objects the local cache holds, so
+        # requests find these indexes instead of rebuilding them
+        index = get_menu_index(branch, menu)
+        if use_numpy(index):
+            get_numpy_index(index)
+        items += len(index)
+    return items
+
+
+# Loads every branch's menu with one query, writes them all to Redis in
+# one pipeline and to the in-process cache, and builds each branch's
+# scoring index, so the first request per branch is not a cold miss.
+# Redis being down only costs the shared tier; the local one still warms
+async def warm_caches():
+    if _preloaded is not None:
+        return await _adopt_preloaded()
+
+    start = time.perf_counter()
+    versions, now, menus = await _load_menus()
+
+    if len(menus) > LOCAL_MENU_CACHE_SIZE:
+        logger.warning(
+            "%d branches but LOCAL_MENU_CACHE_SIZE=%d: only the last %d stay warm in process",
+            len(menus), LOCAL_MENU_CACHE_SIZE, LOCAL_MENU_CACHE_SIZE
+        )
+
+    redis_ok = True
+    try:
+        await set_many(menus=menus)
+        # the menu watcher then only reloads branches edited after this
+        await record_versions(versions, now, [b for b in menus if b in versions])
+    except Exception as e:
+        logger.warning("cache warm-up could not write Redis: %s", e)
+        redis_ok = False
+        for branch, menu in menus.items():
+            local_menu_cache.set(branch, menu)
+
+    items = _build_indexes(menus)
+
+    summary = {
+        "branches": len(menus),
+        "items": items,
+        "redis": redis_ok,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+    logger.info("cache warm-up done: %s", summary)
+    return summary
+
+
+# For a pre-forking server (gunicorn_conf.py): loads every menu and builds
+# its indexes once in the master, so forked workers share them
+# copy-on-write instead of each building their own. Uses MySQL through a
+# pool that is closed again before returning, and never touches Redis:
+# workers must not inherit open connections
+def preload_caches():
+    global _preloaded
+
+    async def load():
+        await init_pool()
+        try:
+            return await _load_menus()
+        finally:
+            await close_pool()
+
+    start = time.perf_counter()
+    versions, _, menus = asyncio.run(load())
+    for branch, menu in menus.items():
+        local_menu_cache.set(branch, menu)
+    items = _build_indexes(menus)
+    # workers swap later copies of these same menus for the shared ones
+    share_menus(menus)
+    _preloaded = (versions, menus)
+    # keeps the collector from touching (and so copying) every page that
+    # holds these objects in each worker
+    gc.freeze()
+    logger.info("preloaded %d branches (%d items) in %.3fs", len(menus), items, time.perf_counter() - start)
+
+
+# warm_caches() in a worker forked after preload_caches(): keeps the
+# inherited menus that are still current and drops the rest, which then
+# load on demand. A recycled worker may fork long after the preload.
+# Redis is filled by the menu watcher's first check, not by every worker
+async def _adopt_preloaded():
+    start = time.perf_counter()
+    preloaded_versions, menus = _preloaded
+    versions, _ = await fetch_menu_versions()
+
+    current = 0
+    for branch, menu in menus.items():
+        if versions.get(branch) == preloaded_versions.get(branch):
+            local_menu_cache.set(branch, menu)
+            current += 1
+        else:
+            local_menu_cache.pop(branch)
+
+    summary = {
+        "branches": len(menus),
+        "preloaded": current,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+    logger.info("adopted preloaded menus: %s", summary)
+    return summary
+
+
+async def main():
+    # As a one-off job (e.g. before shifting traffic) this fills Redis for
+    # every instance; the in-process tier only matters to the app itself
+    await init_pool()
+    try:
+        print(json.dumps(await warm_caches()))
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Preload every branch menu into Redis").parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from menu_codec import decode_menu, encode_menu
+from menu_index import MenuIndex, cached_menu_index
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Processes for CPU-heavy scoring / deal building, so a big menu or batch
+# doesn't stall every other request on the event loop. 0 runs everything
+# inline
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", 0))
+# Jobs cheaper than this (menu items x questions) run inline: below it the
+# round trip to a worker (~0.2 ms) costs more than it saves
+COMPUTE_INLINE_MAX_COST = int(os.getenv("COMPUTE_INLINE_MAX_COST", 2000))
+# "fork" lets workers inherit the indexes already built (and preloaded)
+# by this process; with "spawn"/"forkserver" they are sent on first use
+COMPUTE_START_METHOD = os.getenv("COMPUTE_START_METHOD", "fork")
+
+COMPUTE_JOBS = Counter("compute_jobs_total", "Scoring jobs by where they ran", ["mode"])
+COMPUTE_QUEUE_DEPTH = Gauge("compute_queue_depth", "Jobs waiting for or running in the compute pool")
+COMPUTE_SECONDS = Histogram(
+    "compute_pool_seconds",
+    "Compute pool job time: waiting for a worker (queue) and running (run)",
+    ["phase"]
+)
+COMPUTE_QUEUE_DEPTH.set(0)
+
+_executor = None
+
+# Worker side: branch -> (version, value) of what this worker holds
+_worker_menus = {}
+_worker_popularity = {}
+
+
+def start_pool():
+    global _executor
+    if COMPUTE_WORKERS > 0 and _executor is None:
+        _executor = ProcessPoolExecutor(
+            COMPUTE_WORKERS, mp_context=multiprocessing.get_context(COMPUTE_START_METHOD)
+        )
+    return _executor
+
+
+# wait=False returns at once and leaves joining the workers to the
+# executor's own management thread
+def shutdown_pool(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+
+
+def should_offload(items, questions=1):
+    return _executor is not None and items * questions >= COMPUTE_INLINE_MAX_COST
+
+
+def _worker_index(branch, version, menu_payload):
+    held = _worker_menus.get(branch)
+    if held is not None and held[0] == version:
+        return held[1]
+
+    index = None
+    inherited = cached_menu_index(branch)
+    if inherited is not None and inherited.version == version:
+        index = inherited
+    elif menu_payload is not None:
+        menu, _, index = decode_menu(menu_payload)
+        if index is None:
+            index = MenuIndex(menu, version=version)
+    if index is not None:
+        _worker_menus[branch] = (version, index)
+    return index
+
+
+def _worker_counts(branch, version, popularity):
+    held = _worker_popularity.get(branch)
+    if held is not None and held[0] == version:
+        return held[1]
+    if popularity is None:
+        return None
+    _worker_popularity[branch] = (version, popularity)
+    return popularity
+
+
+def _run(fn, branch, index, popularity, questions):
+    # one failing question doesn't fail the others
+    results = []
+    for q in questions:
+        try:
+            results.append(fn(branch, q, index, popularity))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# Runs in a worker. Only ids and version stamps come in; the menu and
+# popularity are sent (and kept) only when this worker doesn't hold that
+# version yet. Returns (start time, results), or (start time, None) to
+# ask for them
+def _compute(fn, branch, menu_version, popularity_version, questions, menu_payload=None, popularity=None):
+    started = time.time()
+    index = _worker_index(branch, menu_version, menu_payload)
+    counts = _worker_counts(branch, popularity_version, popularity)
+    if index is None or counts is None:
+        return started, None
+    return started, _run(fn, branch, index, counts, questions)
+
+
+async def _submit(fn, branch, index, popularity, popularity_version, questions):
+    executor = _executor
+    loop = asyncio.get_running_loop()
+    COMPUTE_QUEUE_DEPTH.inc()
+    try:
+        submitted = time.time()
+        started, results = await loop.run_in_executor(
+            executor, _compute, fn, branch, index.version, popularity_version, questions
+        )
+        if results is None:
+            COMPUTE_JOBS.inc("resend")
+            submitted = time.time()
+            started, results = await loop.run_in_executor(
+                executor, _compute, fn, branch, index.version, popularity_version, questions,
+                encode_menu(index.items, 0, index), popularity
+            )
+        COMPUTE_SECONDS.observe(max(0.0, started - submitted), "queue")
+        COMPUTE_SECONDS.observe(max(0.0, time.time() - started), "run")
+        COMPUTE_JOBS.inc("pool")
+        return results
+    except BrokenProcessPool as e:
+        # a worker died (e.g. OOM-killed): answer inline, start a new pool.
+        # Not waiting for the dead one, which would block the event loop
+        logger.warning("compute pool broken, running inline: %r", e)
+        if _executor is executor:
+            shutdown_pool(wait=False)
+            start_pool()
+        COMPUTE_JOBS.inc("inline")
+        return _run(fn, branch, index, popularity, questions)
+    finally:
+        COMPUTE_QUEUE_DEPTH.dec()
+
+
+# fn(branch, question, index, popularity) for every question, inline or
+# split across the pool depending on cost. Returns one result per
+# question, in order; a failed question gets its exception instead
+async def run_job(fn, branch, index, popularity, popularity_version, questions):
+    if not should_offload(len(index), len(questions)):
+        COMPUTE_JOBS.inc("inline")
+        return _run(fn, branch, index, popularity, questions)
+
+    chunks = min(COMPUTE_WORKERS, len(questions))
+    size = -(-len(questions) // chunks)
+    parts = await asyncio.gather(*(
+        _submit(fn, branch, index, popularity, popularity_version, questions[i:i + size])
+        for i in range(0, len(questions), size)
+    ))
+    return [result for part in parts for result in part]
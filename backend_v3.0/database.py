@@ -1,30 +1,192 @@
 import aiomysql
+import asyncio
 import os
+from collections import Counter
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
+from metrics import Gauge, STAGE_SECONDS
+
 load_dotenv()
 
+# Pool sizing (shared by every fetch function in this module)
+POOL_MIN = int(os.getenv("MYSQL_POOL_MIN", 2))
+POOL_MAX = int(os.getenv("MYSQL_POOL_MAX", 10))
+# Recycle connections older than this many seconds (-1 disables)
+POOL_RECYCLE = int(os.getenv("MYSQL_POOL_RECYCLE", 3600))
+# Ping a connection before use if it has been idle longer than this
+POOL_PING_IDLE = float(os.getenv("MYSQL_POOL_PING_IDLE", 30))
+
+# Window (days) of order history that counts towards popularity
+POPULARITY_DAYS = int(os.getenv("POPULARITY_DAYS", 30))
+
+# Hot queries (also EXPLAIN-checked by migrations.py)
+MENU_QUERY = "SELECT name, category, portion, price FROM menu WHERE branch=%s"
+# Every branch's menu in one round trip, for the startup cache warmer
+ALL_MENUS_QUERY = "SELECT branch, name, category, portion, price FROM menu ORDER BY branch"
+# Per-branch change stamp for the menu watcher: updated_at catches edits
+# and inserts, the row count catches deletes
+MENU_VERSIONS_QUERY = (
+    "SELECT branch, MAX(updated_at) AS updated_at, COUNT(*) AS items, NOW() AS now "
+    "FROM menu GROUP BY branch"
+)
+POPULARITY_QUERY = (
+    "SELECT item_name, SUM(cnt) as cnt FROM order_item_daily "
+    "WHERE branch=%s AND order_day >= CURDATE() - INTERVAL %s DAY GROUP BY item_name"
+)
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def _warm_up(pool):
+    # Open and verify POOL_MIN connections so the first requests
+    # don't pay the TCP + auth handshake
+    conns = []
+    try:
+        for _ in range(pool.minsize):
+            conn = await pool.acquire()
+            conns.append(conn)
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT 1")
+    finally:
+        for conn in conns:
+            pool.release(conn)
+
+
+async def init_pool():
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await aiomysql.create_pool(
+                host=os.getenv("MYSQL_HOST"),
+                port=int(os.getenv("MYSQL_PORT")),
+                user=os.getenv("MYSQL_USER"),
+                password=os.getenv("MYSQL_PASSWORD"),
+                db=os.getenv("MYSQL_DB"),
+                autocommit=True,
+                minsize=POOL_MIN,
+                maxsize=POOL_MAX,
+                pool_recycle=POOL_RECYCLE
+            )
+            await _warm_up(_pool)
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            await _pool.wait_closed()
+            _pool = None
+
+
 async def get_pool():
-    return await aiomysql.create_pool(
-        host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        db=os.getenv("MYSQL_DB"),
-        autocommit=True
-    )
+    # Normally created once by the app lifespan; lazily created here
+    # for scripts that use this module without FastAPI
+    if _pool is None:
+        return await init_pool()
+    return _pool
 
-async def fetch_menu(branch):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute("SELECT * FROM menu WHERE branch=%s", (branch,))
-            return await cur.fetchall()
 
-async def fetch_recent_orders(branch):
+@asynccontextmanager
+async def get_connection():
     pool = await get_pool()
     async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute("SELECT item_name, COUNT(*) as cnt FROM orders WHERE branch=%s GROUP BY item_name", (branch,))
-            rows = await cur.fetchall()
-            return {row["item_name"]: row["cnt"] for row in rows}
+        # Health-check connections that sat idle long enough for MySQL
+        # (wait_timeout) or a proxy to have dropped them
+        if asyncio.get_running_loop().time() - conn.last_usage > POOL_PING_IDLE:
+            await conn.ping(reconnect=True)
+        yield conn
+
+
+# Connections by state, for /metrics and readiness checks
+def pool_stats():
+    if _pool is None:
+        return {"max": POOL_MAX, "size": 0, "free": 0, "in_use": 0}
+    return {
+        "max": _pool.maxsize,
+        "size": _pool.size,
+        "free": _pool.freesize,
+        "in_use": _pool.size - _pool.freesize
+    }
+
+
+Gauge(
+    "db_pool_connections",
+    "MySQL pool connections by state (max, size, free, in_use)",
+    ["state"],
+    collect=lambda: {(state,): n for state, n in pool_stats().items()}
+)
+
+
+async def fetch_menu(branch):
+    with STAGE_SECONDS.time("db_menu_fetch"):
+        async with get_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(MENU_QUERY, (branch,))
+                return await cur.fetchall()
+
+# {branch: rows}, rows shaped like fetch_menu's
+async def fetch_all_menus():
+    with STAGE_SECONDS.time("db_all_menus_fetch"):
+        async with get_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(ALL_MENUS_QUERY)
+                rows = await cur.fetchall()
+
+    menus = {}
+    for row in rows:
+        branch = row.pop("branch")
+        menus.setdefault(branch, []).append(row)
+    return menus
+
+
+# Returns ({branch: (updated_at, items)}, the database's current time)
+async def fetch_menu_versions():
+    with STAGE_SECONDS.time("db_menu_versions_fetch"):
+        async with get_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(MENU_VERSIONS_QUERY)
+                rows = await cur.fetchall()
+
+    now = rows[0]["now"] if rows else None
+    return {row["branch"]: (row["updated_at"], row["items"]) for row in rows}, now
+
+
+# Popularity from the daily rollup: O(items x days) instead of O(orders)
+async def fetch_recent_orders(branch, days=POPULARITY_DAYS):
+    with STAGE_SECONDS.time("db_popularity_fetch"):
+        async with get_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(POPULARITY_QUERY, (branch, days))
+                rows = await cur.fetchall()
+                return {row["item_name"]: int(row["cnt"]) for row in rows}
+
+
+# Append a batch of (branch, item_name, order_date) rows and fold them into
+# the daily rollup in the same transaction. Returns the per-day counts
+# that were added, keyed by (branch, item_name, order_day)
+async def insert_orders(orders):
+    daily = Counter((branch, item_name, order_date.date()) for branch, item_name, order_date in orders)
+
+    async with get_connection() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    "INSERT INTO orders (branch, item_name, order_date) VALUES (%s, %s, %s)",
+                    orders
+                )
+                await cur.executemany(
+                    "INSERT INTO order_item_daily (branch, item_name, order_day, cnt) VALUES (%s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)",
+                    [(branch, item_name, day, n) for (branch, item_name, day), n in daily.items()]
+                )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+
+    return daily
@@ -0,0 +1,89 @@
+import os
+
+# DP cells are slices of this many rupees of per-person price (rounded
+# up), so the table has about hard_budget / (peoples * PRICE_UNIT)
+# columns. Exact costs are tracked alongside, so a deal never goes over
+# hard_budget
+PRICE_UNIT = int(os.getenv("DEAL_PRICE_UNIT", 50))
+# Items per category the DP may choose from (best scores first)
+CANDIDATES_PER_CATEGORY = int(os.getenv("DEAL_CANDIDATES_PER_CATEGORY", 8))
+# Value of including any item, so a zero-score item still beats an
+# empty slot when it fits the budget
+ITEM_BONUS = int(os.getenv("DEAL_ITEM_BONUS", 1))
+
+
+def _units(price):
+    return -(-price // PRICE_UNIT)
+
+
+# Up to CANDIDATES_PER_CATEGORY allowed items of each priority category,
+# as (value, cost, position, category)
+def candidates(index, scores, allowed, peoples, cat_priority):
+    groups = []
+    for cat in dict.fromkeys(cat_priority):
+        positions = [i for i in index.categories.get(cat, ()) if allowed[i]]
+        if not positions:
+            continue
+        positions.sort(key=lambda i: (-scores[i], index.items[i]["price"], i))
+        groups.append([
+            (int(scores[i]) + ITEM_BONUS, peoples * index.items[i]["price"], i, cat)
+            for i in positions[:CANDIDATES_PER_CATEGORY]
+        ])
+    return groups
+
+
+# Multiple-choice knapsack: at most one item from each category (qty =
+# peoples), total cost <= hard_budget, maximize total value. Each DP cell
+# keeps its top k partial deals, so the k best distinct deals come out
+# of a single pass. Ties prefer the deal closest to ideal_budget
+def best_deals(index, scores, allowed, peoples, ideal_budget, hard_budget, cat_priority, k=3):
+    # no party to size cells by; callers fall back to the greedy deals
+    if peoples <= 0:
+        return []
+    groups = candidates(index, scores, allowed, peoples, cat_priority)
+    # rounding adds < 1 unit per item, so no deal within budget lands past this
+    last_cell = hard_budget // (peoples * PRICE_UNIT) + len(groups)
+
+    # used units -> [(value, cost, picks)]
+    table = {0: [(0, 0, ())]}
+    for group in groups:
+        options = [(value, cost, _units(index.items[i]["price"]), (i, cat)) for value, cost, i, cat in group]
+        options = [o for o in options if o[1] <= hard_budget]
+        if not options:
+            continue
+
+        nxt = {used: list(entries) for used, entries in table.items()}
+        for used, entries in table.items():
+            for value, cost, units, pick in options:
+                if used + units > last_cell:
+                    continue
+                bucket = nxt.setdefault(used + units, [])
+                for v, c, picks in entries:
+                    if c + cost <= hard_budget:
+                        bucket.append((v + value, c + cost, picks + (pick,)))
+
+        # within a cell keep the k most valuable, cheapest first on ties,
+        # which leaves the most room for later categories
+        for bucket in nxt.values():
+            if len(bucket) > k:
+                bucket.sort(key=lambda e: (-e[0], e[1]))
+                del bucket[k:]
+        table = nxt
+
+    found = [entry for entries in table.values() for entry in entries if entry[2]]
+    found.sort(key=lambda e: (-e[0], abs(ideal_budget - e[1]), e[1]))
+
+    deals = []
+    for value, cost, picks in found[:k]:
+        items = []
+        for i, cat in picks:
+            item = index.items[i]
+            items.append({
+                "name": item["name"],
+                "category": item["category"],
+                "qty": peoples,
+                "unit_price": item["price"],
+                "total_price": peoples * item["price"]
+            })
+        deals.append((items, cost))
+    return deals
@@ -0,0 +1,61 @@
+# Multi-process serving: one uvicorn worker per core, each with its own
+# event loop, MySQL pool and in-process caches (nothing is shared between
+# workers at runtime; Redis is the shared tier).
+#
+#   gunicorn -c gunicorn_conf.py main:app
+#
+# Menus and scoring indexes are built once in the master before forking
+# (cache_warmer.preload_caches), so workers start warm and share those
+# pages copy-on-write.
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app in the master so preload_caches() runs before the fork
+preload_app = os.getenv("PRELOAD", "1") == "1"
+
+# Graceful recycling: a worker is replaced after MAX_REQUESTS requests
+# (plus jitter, so they don't all restart at once) and gets
+# GRACEFUL_TIMEOUT seconds to finish in-flight requests and run its
+# lifespan shutdown (closing its pool) on restart or SIGTERM
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+# MYSQL_CONNECTION_BUDGET is what the whole instance may hold open
+# (e.g. max_connections divided by instances); every worker gets an equal
+# share as its MYSQL_POOL_MAX. Without it, each worker uses
+# MYSQL_POOL_MAX as is
+MYSQL_CONNECTION_BUDGET = os.getenv("MYSQL_CONNECTION_BUDGET")
+if MYSQL_CONNECTION_BUDGET:
+    pool_max = max(1, int(MYSQL_CONNECTION_BUDGET) // workers)
+    pool_min = min(int(os.getenv("MYSQL_POOL_MIN", 2)), pool_max)
+    # read by database.py when the app is imported
+    os.environ["MYSQL_POOL_MAX"] = str(pool_max)
+    os.environ["MYSQL_POOL_MIN"] = str(pool_min)
+
+
+def when_ready(server):
+    # runs in the master, after the app import and before any worker forks
+    if preload_app and os.getenv("WARM_ON_STARTUP", "1") == "1":
+        from cache_warmer import preload_caches
+        try:
+            preload_caches()
+        except Exception as e:
+            server.log.warning("preload failed, workers will warm up themselves: %r", e)
+
+
+def post_fork(server, worker):
+    server.log.info(
+        "worker %s: MYSQL_POOL_MIN=%s MYSQL_POOL_MAX=%s",
+        worker.pid, os.getenv("MYSQL_POOL_MIN", 2), os.getenv("MYSQL_POOL_MAX", 10)
+    )
@@ -1,14 +1,96 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
+from database import init_pool, close_pool
+from migrations import migrate
+from redis_cache import listen_for_menu_invalidations
 from recommend_local import router as recommend_router
+from orders import router as orders_router
+from metrics import MetricsMiddleware, router as metrics_router
+from health import mark_warm, router as health_router
+from cache_warmer import warm_caches
+from menu_watcher import MENU_WATCH_INTERVAL, watch_menus
+from compute_pool import start_pool, shutdown_pool
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") == "1"
+WARM_ON_STARTUP = os.getenv("WARM_ON_STARTUP", "1") == "1"
+WARM_TIMEOUT = float(os.getenv("WARM_TIMEOUT", 30))
+# Seconds between retries of a failed start-up (MySQL pool, migrations,
+# cache warm-up)
+WARM_RETRY_INTERVAL = float(os.getenv("WARM_RETRY_INTERVAL", 10))
+
+
+# MySQL pool, migrations and cache warm-up. Returns whether all of them
+# succeeded; each is safe to run again
+async def _start_up():
+    try:
+        await asyncio.wait_for(init_pool(), WARM_TIMEOUT)
+        if MIGRATE_ON_STARTUP:
+            await migrate()
+    except Exception as e:
+        logger.warning("MySQL not available at startup: %r", e)
+        return False
+    if not WARM_ON_STARTUP:
+        return True
+    try:
+        await asyncio.wait_for(warm_caches(), WARM_TIMEOUT)
+        return True
+    except Exception as e:
+        logger.warning("cache warm-up failed, menus will load on demand: %r", e)
+        return False
+
 
-app = FastAPI()
+# Readiness stays off until a retry succeeds; meanwhile requests that
+# reach this process still open connections and load menus on demand
+async def _retry_start_up():
+    while True:
+        await asyncio.sleep(WARM_RETRY_INTERVAL)
+        if await _start_up():
+            mark_warm()
+            return
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    invalidation_listener = asyncio.create_task(listen_for_menu_invalidations())
+    # One MySQL pool per process, shared by every request, then the caches.
+    # Readiness waits for these. If MySQL is down the app still starts
+    # (a failed lifespan would stop the gunicorn master), but is not
+    # ready until a background retry succeeds
+    started = await _start_up()
+    # Reloads menus as soon as they are edited in MySQL
+    background = [invalidation_listener]
+    if MENU_WATCH_INTERVAL > 0:
+        background.append(asyncio.create_task(watch_menus()))
+    # after warm-up, so forked compute workers inherit the built indexes
+    start_pool()
+    if started:
+        mark_warm()
+    else:
+        background.append(asyncio.create_task(_retry_start_up()))
+    yield
+    mark_warm(False)
+    shutdown_pool()
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 def home():
     return {"message": "Restaurant Recommendation API Running"}
 
-@app.get("/health")
-def health():
-    return {"status": "ok"}
-
 app.include_router(recommend_router, prefix="/api")
+app.include_router(orders_router, prefix="/api")
+app.include_router(metrics_router)
+app.include_router(health_router)
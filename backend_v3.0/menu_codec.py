@@ -0,0 +1,140 @@
+import array
+import hashlib
+import json
+import os
+import struct
+import sys
+from types import MappingProxyType
+
+from local_cache import freeze_menu
+from menu_index import MOOD_KEYWORDS, SPICE_LEVELS, MenuIndex
+
+# How menus are written to Redis: "binary" (compact, columnar) or "json"
+# (the original envelope). Both are always readable, so switching back to
+# json is just a config change; old entries age out with their TTL
+MENU_CODEC = os.getenv("MENU_CODEC", "binary")
+
+# Binary layout, all little-endian:
+#   header      magic "MNU", schema version, fetched_at, item count,
+#               MenuIndex.version, keyword-table fingerprint
+#   strings     count, per-string length (chars), one UTF-8 blob; every
+#               name/category/portion is stored once and referenced by position
+#   columns     name, category, portion (string ids), price,
+#               mood mask, spice mask (as computed by MenuIndex)
+MAGIC = b"MNU"
+SCHEMA_VERSION = 1
+_HEADER = struct.Struct("<3sBdI12s8s")
+_COUNT = struct.Struct("<I")
+
+# Masks in a payload are only reused if it was written with the same
+# keyword tables; otherwise they are recomputed on decode
+KEYWORDS_FINGERPRINT = hashlib.sha1(
+    json.dumps([MOOD_KEYWORDS, SPICE_LEVELS], sort_keys=True).encode()
+).digest()[:8]
+
+
+def _pack(typecode, values):
+    arr = array.array(typecode, values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _unpack(typecode, data, offset, count):
+    arr = array.array(typecode)
+    end = offset + count * arr.itemsize
+    arr.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr, end
+
+
+def encode_json(menu, fetched_at):
+    entry = {"menu": [dict(item) for item in menu], "fetched_at": fetched_at}
+    return json.dumps(entry, default=str)
+
+
+def encode_binary(menu, fetched_at, index):
+    strings = {}
+    columns = ([], [], [])
+    for item in menu:
+        for column, field in zip(columns, ("name", "category", "portion")):
+            column.append(strings.setdefault(item[field], len(strings)))
+
+    table = list(strings)
+    text = "".join(table).encode()
+    return b"".join([
+        _HEADER.pack(MAGIC, SCHEMA_VERSION, fetched_at, len(menu), index.version.encode(), KEYWORDS_FINGERPRINT),
+        _COUNT.pack(len(table)),
+        _pack("I", [len(s) for s in table]),
+        _COUNT.pack(len(text)),
+        text,
+        _pack("I", columns[0]),
+        _pack("I", columns[1]),
+        _pack("I", columns[2]),
+        _pack("i", [item["price"] for item in menu]),
+        bytes(index.mood_masks),
+        bytes(index.spice_masks),
+    ])
+
+
+def _fits_binary(item):
+    return type(item["price"]) is int and all(type(item[f]) is str for f in ("name", "category", "portion"))
+
+
+# `index` must be MenuIndex(menu); its version and masks go into the
+# payload so readers don't recompute them. Falls back to JSON for menus
+# the binary layout can't hold (non-integer prices, NULL strings)
+def encode_menu(menu, fetched_at, index):
+    if MENU_CODEC == "binary" and all(_fits_binary(item) for item in menu):
+        return encode_binary(menu, fetched_at, index)
+    return encode_json(menu, fetched_at)
+
+
+def _decode_binary(data):
+    magic, schema, fetched_at, n, version, fingerprint = _HEADER.unpack_from(data)
+    if schema != SCHEMA_VERSION:
+        raise ValueError(f"unsupported menu schema version {schema}")
+
+    offset = _HEADER.size
+    (n_strings,) = _COUNT.unpack_from(data, offset)
+    lengths, offset = _unpack("I", data, offset + _COUNT.size, n_strings)
+    (text_len,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    text = data[offset:offset + text_len].decode()
+    offset += text_len
+
+    table = []
+    pos = 0
+    for length in lengths:
+        table.append(text[pos:pos + length])
+        pos += length
+
+    names, offset = _unpack("I", data, offset, n)
+    categories, offset = _unpack("I", data, offset, n)
+    portions, offset = _unpack("I", data, offset, n)
+    prices, offset = _unpack("i", data, offset, n)
+    mood_masks = data[offset:offset + n]
+    spice_masks = data[offset + n:offset + 2 * n]
+
+    menu = tuple(
+        MappingProxyType({"name": table[a], "category": table[b], "portion": table[c], "price": price})
+        for a, b, c, price in zip(names, categories, portions, prices)
+    )
+    if fingerprint == KEYWORDS_FINGERPRINT:
+        index = MenuIndex(menu, version=version.decode(), mood_masks=mood_masks, spice_masks=spice_masks)
+    else:
+        index = MenuIndex(menu, version=version.decode())
+    return menu, fetched_at, index
+
+
+# Returns (menu, fetched_at, index or None) for any format ever written:
+# binary, the JSON envelope, or a bare JSON list (treated as stale)
+def decode_menu(data):
+    if isinstance(data, bytes) and data[:3] == MAGIC:
+        return _decode_binary(data)
+
+    entry = json.loads(data)
+    if isinstance(entry, list):
+        return freeze_menu(entry), 0, None
+    return freeze_menu(entry["menu"]), entry["fetched_at"], None
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+
+from local_cache import LocalCache
+from metrics import register_local_cache
+
+# Keywords that make an item match a mood / spice level
+MOOD_KEYWORDS = {
+    "spicy_craving": ["spicy", "hot"],
+    "cheesy_mood": ["cheese", "cheesy"],
+    "sweet_craving": ["sweet", "dessert", "cake", "brownie"],
+    "healthy_choice": ["salad", "grill", "low fat"],
+    "heavy_meal": ["karahi", "biryani", "handi", "qorma"],
+    "light_meal": ["soup", "salad", "fries"]
+}
+
+SPICE_LEVELS = {
+    "low": ["mild", "light"],
+    "medium": ["regular", "medium"],
+    "high": ["hot", "spicy"]
+}
+
+# One bit per mood / spice level
+MOOD_BITS = {mood: 1 << i for i, mood in enumerate(MOOD_KEYWORDS)}
+SPICE_BITS = {spice: 1 << i for i, spice in enumerate(SPICE_LEVELS)}
+
+
+def keyword_mask(name_lower, keywords, bits):
+    mask = 0
+    for key, words in keywords.items():
+        for w in words:
+            if w in name_lower:
+                mask |= bits[key]
+                break
+    return mask
+
+
+# Everything about a branch's menu that doesn't depend on the question,
+# computed once per menu version
+class MenuIndex:
+
+    # version and masks can be passed in when they were computed before,
+    # e.g. decoded from a cached menu (see menu_codec)
+    def __init__(self, menu, version=None, mood_masks=None, spice_masks=None):
+        self.items = tuple(menu)
+        # content stamp: same menu rows -> same version
+        self.version = version or hashlib.sha1(
+            json.dumps([dict(item) for item in self.items], sort_keys=True, default=str).encode()
+        ).hexdigest()[:12]
+        self.names_lower = tuple(item["name"].lower() for item in self.items)
+        if mood_masks is None:
+            mood_masks = (keyword_mask(n, MOOD_KEYWORDS, MOOD_BITS) for n in self.names_lower)
+        if spice_masks is None:
+            spice_masks = (keyword_mask(n, SPICE_LEVELS, SPICE_BITS) for n in self.names_lower)
+        self.mood_masks = tuple(mood_masks)
+        self.spice_masks = tuple(spice_masks)
+
+        # category -> item positions, in menu order
+        categories = {}
+        for i, item in enumerate(self.items):
+            categories.setdefault(item["category"], []).append(i)
+        self.categories = {cat: tuple(idx) for cat, idx in categories.items()}
+
+        # column-wise copy, built on demand by scoring_numpy
+        self.numpy_index = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def scores(self, mood, spice, popularity):
+        mood_bit = MOOD_BITS.get(mood, 0)
+        spice_bit = SPICE_BITS.get(spice, 0)
+        return [
+            (2 if m & mood_bit else 0) +
+            (3 if s & spice_bit else 0) +
+            popularity.get(item["name"], 0)
+            for item, m, s in zip(self.items, self.mood_masks, self.spice_masks)
+        ]
+
+    def allowed(self, avoid):
+        avoid = avoid.lower()
+        return [avoid not in n for n in self.names_lower]
+
+    def scored_item(self, i, score):
+        item = self.items[i]
+        return {
+            "name": item["name"],
+            "category": item["category"],
+            "portion": item["portion"],
+            "price": item["price"],
+            "score": score
+        }
+
+    # Highest-scoring allowed item per category. Ties go to the item that
+    # comes first in the menu, same as a stable sort by score would give
+    def best_by_category(self, mood, spice, avoid, popularity):
+        scores = self.scores(mood, spice, popularity)
+        allowed = self.allowed(avoid)
+
+        best = {}
+        for cat, idx in self.categories.items():
+            top = None
+            for i in idx:
+                if allowed[i] and (top is None or scores[i] > scores[top]):
+                    top = i
+            if top is not None:
+                best[cat] = self.scored_item(top, scores[top])
+        return best
+
+
+MENU_INDEX_CACHE_SIZE = int(os.getenv("LOCAL_MENU_CACHE_SIZE", 256))
+
+# branch -> (menu, MenuIndex); reused for as long as the cache hands out
+# the same menu object
+_index_cache = LocalCache(MENU_INDEX_CACHE_SIZE, float("inf"))
+register_local_cache("menu_index", _index_cache)
+
+
+def get_menu_index(branch, menu):
+    entry = _index_cache.get(branch)
+    if entry is not None and entry[0] is menu:
+        return entry[1]
+
+    index = MenuIndex(menu)
+    _index_cache.set(branch, (menu, index))
+    return index
+
+
+# For callers that already hold the index of `menu`, e.g. decoded with it
+def put_menu_index(branch, menu, index):
+    _index_cache.set(branch, (menu, index))
+
+
+# The index last built for `branch`, whatever menu it was built from
+def cached_menu_index(branch):
+    entry = _index_cache.get(branch)
+    return None if entry is None else entry[1]
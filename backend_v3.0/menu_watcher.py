@@ -0,0 +1,107 @@
+import asyncio
+import datetime
+import logging
+import os
+
+from cache_keys import LOCK, cache_key
+from database import fetch_menu, fetch_menu_versions
+from metrics import Counter, STAGE_SECONDS
+from redis_cache import PROCESS_ID, invalidate_menu, redis_client, set_many
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for edited menus; 0 turns the watcher off, and
+# menus then only follow REDIS_TTL
+MENU_WATCH_INTERVAL = float(os.getenv("MENU_WATCH_INTERVAL", 5))
+# updated_at has one-second resolution and rows are stamped before their
+# transaction commits, so a stamp this recent may still gain edits. Such
+# branches are refreshed again on the next check
+MENU_WATCH_SETTLE = float(os.getenv("MENU_WATCH_SETTLE", 2))
+
+# Redis hash: branch -> change stamp of the menu currently cached
+VERSIONS_KEY = cache_key("menu_versions")
+# Only one process per interval runs the check; the rest hear about
+# changes through the invalidation channel
+WATCH_LOCK_KEY = cache_key(LOCK, "menu_watch")
+
+MENU_CHANGES = Counter("menu_changes_total", "Menu changes picked up by the watcher", ["action"])
+
+
+def _stamp(updated_at, items):
+    return f"{updated_at}/{items}"
+
+
+def _settled(updated_at, now):
+    if updated_at is None or now is None:
+        return True
+    return now - updated_at > datetime.timedelta(seconds=MENU_WATCH_SETTLE)
+
+
+# Stores the stamps of `branches` (whose menus were just cached) and
+# forgets those in `forget`. Unsettled stamps are forgotten too, so the
+# next check reloads those branches again
+async def record_versions(versions, now, branches, forget=()):
+    settled = {}
+    unsettled = [str(branch) for branch in forget]
+    for branch in branches:
+        updated_at, items = versions[branch]
+        if _settled(updated_at, now):
+            settled[str(branch)] = _stamp(updated_at, items)
+        else:
+            unsettled.append(str(branch))
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if settled:
+            pipe.hset(VERSIONS_KEY, mapping=settled)
+        if unsettled:
+            pipe.hdel(VERSIONS_KEY, *unsettled)
+        await pipe.execute()
+
+
+# Reloads only the branches whose menu changed since it was cached (and
+# drops deleted ones). Returns {"refreshed": [...], "removed": [...]}, or
+# None if another process holds this interval's check
+async def check_menus():
+    locked = await redis_client.set(
+        WATCH_LOCK_KEY, PROCESS_ID, nx=True, px=max(1, int(MENU_WATCH_INTERVAL * 1000))
+    )
+    if not locked:
+        return None
+
+    # versions are read before the menus, so a recorded stamp is never
+    # newer than the menu cached with it
+    versions, now = await fetch_menu_versions()
+    known = await redis_client.hgetall(VERSIONS_KEY)
+
+    changed = [
+        branch for branch, (updated_at, items) in versions.items()
+        if known.get(str(branch)) != _stamp(updated_at, items)
+    ]
+    removed = [int(branch) for branch in known if int(branch) not in versions]
+
+    if changed:
+        menus = await asyncio.gather(*(fetch_menu(branch) for branch in changed))
+        # writes Redis and publishes each branch's new menu version
+        await set_many(menus=dict(zip(changed, menus)))
+    for branch in removed:
+        await invalidate_menu(branch)
+
+    await record_versions(versions, now, changed, forget=removed)
+
+    MENU_CHANGES.inc("refreshed", amount=len(changed))
+    MENU_CHANGES.inc("removed", amount=len(removed))
+    if changed or removed:
+        logger.info("menu watcher: refreshed %s, removed %s", changed, removed)
+    return {"refreshed": changed, "removed": removed}
+
+
+async def watch_menus():
+    while True:
+        try:
+            with STAGE_SECONDS.time("menu_watch"):
+                await check_menus()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("menu watcher check failed: %s", e)
+        await asyncio.sleep(MENU_WATCH_INTERVAL)
@@ -0,0 +1,186 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# Minimal Prometheus text-format metrics, no client library needed.
+# An update is a dict lookup and an add, cheap enough to leave on in
+# production. Values are per process: with several workers, scrape each.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+router = APIRouter()
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    # `collect`, if given, is called at scrape time and returns
+    # {label values tuple: value}; used for values owned by other modules
+    def __init__(self, name, help, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.values = {}
+        REGISTRY.append(self)
+
+    def samples(self):
+        values = self.collect() if self.collect else self.values
+        for labels, value in values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            # per-bucket (non-cumulative) counts, sum, count
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                yield f"{self.name}_bucket", _labels(names, labels + (bound,)), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), count
+
+
+def render():
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# Time spent in each step of a /recommend call
+STAGE_SECONDS = Histogram(
+    "recommend_stage_seconds",
+    "Time spent per request pipeline stage",
+    ["stage"]
+)
+
+# Redis-tier lookups; in-process tiers are exported from their own counters
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Redis cache lookups by cache and result (hit, stale, miss, error)",
+    ["cache", "result"]
+)
+
+# In-process LocalCache tiers, read from their own counters at scrape time
+_local_caches = {}
+
+
+def register_local_cache(name, cache):
+    _local_caches[name] = cache
+
+
+def _local_cache_stat(field):
+    return lambda: {(name,): getattr(c, field) for name, c in _local_caches.items()}
+
+
+Counter("local_cache_hits_total", "In-process cache hits", ["cache"], collect=_local_cache_stat("hits"))
+Counter("local_cache_misses_total", "In-process cache misses", ["cache"], collect=_local_cache_stat("misses"))
+Counter("local_cache_evictions_total", "In-process cache LRU evictions", ["cache"], collect=_local_cache_stat("evictions"))
+Gauge(
+    "local_cache_entries",
+    "In-process cache entries",
+    ["cache"],
+    collect=lambda: {(name,): len(c) for name, c in _local_caches.items()}
+)
+
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served")
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by handler and status",
+    ["handler", "status"]
+)
+
+
+# Pure ASGI so it adds no per-request task or body buffering.
+# Requests are labelled by route name ("recommend_local"), never by raw
+# path, so unknown URLs can't blow up the label set
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            handler = getattr(scope.get("route"), "name", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, handler, status)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+
+import aiomysql
+
+from database import get_connection, close_pool, MENU_QUERY, MENU_VERSIONS_QUERY, POPULARITY_QUERY
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "migrations")
+
+# Only one process applies migrations at a time (MySQL named lock)
+LOCK_NAME = "restaurant_db_migrations"
+LOCK_TIMEOUT = int(os.getenv("MIGRATION_LOCK_TIMEOUT", 60))
+
+# Hot queries and the index EXPLAIN must report for them
+EXPLAIN_CHECKS = [
+    ("menu by branch", MENU_QUERY, (1,), "idx_menu_branch_category_price"),
+    (
+        "orders in window",
+        "SELECT item_name, COUNT(*) as cnt FROM orders WHERE branch=%s AND order_date >= NOW() - INTERVAL %s DAY GROUP BY item_name",
+        (1, 30),
+        "idx_orders_branch_date_item"
+    ),
+    ("popularity rollup", POPULARITY_QUERY, (1, 30), "PRIMARY"),
+    ("menu versions", MENU_VERSIONS_QUERY, (), "idx_menu_branch_updated"),
+]
+
+
+# Files are named NNN_description.sql and applied in NNN order
+def load_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r"^(\d+)_(.+)\.sql$", filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+            sql = f.read()
+        migrations.append((int(match.group(1)), match.group(2), split_statements(sql)))
+    return migrations
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+async def migrate():
+    applied = []
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+            (locked,) = await cur.fetchone()
+            if locked != 1:
+                raise RuntimeError("Could not acquire the migration lock")
+            try:
+                await cur.execute(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "  version INT PRIMARY KEY,"
+                    "  name VARCHAR(255) NOT NULL,"
+                    "  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+                    ")"
+                )
+                await cur.execute("SELECT version FROM schema_migrations")
+                done = {row[0] for row in await cur.fetchall()}
+
+                # MySQL DDL commits implicitly, so each migration is recorded
+                # right after its statements succeed
+                for version, name, statements in load_migrations():
+                    if version in done:
+                        continue
+                    logger.info("applying migration %03d_%s", version, name)
+                    for stmt in statements:
+                        await cur.execute(stmt)
+                    await cur.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, name)
+                    )
+                    applied.append(version)
+            finally:
+                await cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    return applied
+
+
+# Returns a list of problems; empty means every hot query uses its index
+async def explain_check():
+    problems = []
+    async with get_connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            for label, query, args, index in EXPLAIN_CHECKS:
+                await cur.execute("EXPLAIN " + query, args)
+                plan = await cur.fetchall()
+                if plan[0]["key"] != index:
+                    problems.append(f"{label}: expected {index}, got {plan[0]['key']} ({plan[0]['type']})")
+    return problems
+
+
+async def main(check):
+    try:
+        applied = await migrate()
+        print(f"applied migrations: {applied or 'none'}")
+        if check:
+            problems = await explain_check()
+            for problem in problems:
+                print("EXPLAIN check failed -", problem)
+            if problems:
+                raise SystemExit(1)
+            print("EXPLAIN check passed")
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply sql/migrations to the database")
+    parser.add_argument("--check", action="store_true", help="verify hot queries use their indexes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.check))
@@ -0,0 +1,49 @@
+import datetime
+import logging
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from database import insert_orders
+from redis_cache import record_daily_popularity
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_ORDER_BATCH = int(os.getenv("MAX_ORDER_BATCH", 1000))
+
+
+# Input schema
+class OrderIn(BaseModel):
+    branch: int
+    item_name: str
+    order_date: Optional[datetime.datetime] = None   # defaults to now
+
+
+class OrderBatch(BaseModel):
+    orders: List[OrderIn]
+
+
+@router.post("/orders")
+async def ingest_orders(payload: OrderBatch):
+
+    if not payload.orders:
+        return {"inserted": 0}
+
+    if len(payload.orders) > MAX_ORDER_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ORDER_BATCH} orders per batch")
+
+    now = datetime.datetime.now()
+    rows = [(o.branch, o.item_name, o.order_date or now) for o in payload.orders]
+
+    daily = await insert_orders(rows)
+
+    # MySQL is the source of truth; a failed mirror update is only logged
+    try:
+        await record_daily_popularity(daily)
+    except Exception as e:
+        logger.warning("popularity mirror update failed: %s", e)
+
+    return {"inserted": len(rows)}
@@ -1,10 +1,38 @@
-from fastapi import APIRouter
+import asyncio
+import logging
+import os
+from typing import List
+
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
 from database import fetch_menu, fetch_recent_orders
-from redis_cache import get_menu_from_cache, store_menu_in_cache
+from menu_index import MOOD_KEYWORDS, SPICE_LEVELS, get_menu_index
+from scoring_numpy import NUMPY_MIN_ITEMS, SCORING_BACKEND, best_by_category, score_items
+from deal_optimizer import CANDIDATES_PER_CATEGORY, ITEM_BONUS, PRICE_UNIT, best_deals
+from compute_pool import run_job
+from response_cache import (
+    config_version,
+    response_key,
+    get_cached_response,
+    store_cached_response,
+    get_cached_responses,
+    store_cached_responses
+)
+from redis_cache import CACHE_TIMEOUT, get_branches, get_menu, get_popularity
+from metrics import STAGE_SECONDS
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# "knapsack" (deal_optimizer) or "greedy" (build_deal with rotated priorities)
+DEAL_ENGINE = os.getenv("DEAL_ENGINE", "knapsack")
+
+# Max questions per /recommend/batch call
+MAX_BATCH = int(os.getenv("MAX_BATCH", 500))
+
+# Upper bound (seconds) on loading a menu, including a cold MySQL fetch
+MENU_TIMEOUT = float(os.getenv("MENU_TIMEOUT", 2.0))
 
 
 # Input schema
@@ -43,6 +71,23 @@ DEFAULT_PRIORITY = [
     "Dessert",
 ]
 
+# Everything besides the menu, popularity and question that shapes an
+# answer. Part of every response cache key, so workers restarted with
+# other settings don't serve (or get served) answers computed under the
+# old ones
+ANSWER_CONFIG = config_version(
+    DEAL_ENGINE,
+    PRICE_UNIT,
+    CANDIDATES_PER_CATEGORY,
+    ITEM_BONUS,
+    SCORING_BACKEND,
+    NUMPY_MIN_ITEMS,
+    MEAL_PRIORITY,
+    DEFAULT_PRIORITY,
+    MOOD_KEYWORDS,
+    SPICE_LEVELS
+)
+
 
 # Peoples + Budget + Mood based budget calculator
 def get_budget_range(peoples, budget, mood):
@@ -82,52 +127,43 @@ def get_budget_range(peoples, budget, mood):
     return int(final * 0.7), int(final), int(final * 1.3)
 
 
-# Mood scoring
-def mood_match(name, mood):
-    mood_keywords = {
-        "spicy_craving": ["spicy", "hot"],
-        "cheesy_mood": ["cheese", "cheesy"],
-        "sweet_craving": ["sweet", "dessert", "cake", "brownie"],
-        "healthy_choice": ["salad", "grill", "low fat"],
-        "heavy_meal": ["karahi", "biryani", "handi", "qorma"],
-        "light_meal": ["soup", "salad", "fries"]
-    }
-
-    if mood not in mood_keywords:
-        return 0
+# Served from the local/Redis tiers (possibly stale while a refresh runs);
+# MySQL is only hit on a cold miss, once per branch
+async def load_menu(branch):
+    with STAGE_SECONDS.time("menu_load"):
+        return await asyncio.wait_for(get_menu(branch, fetch_menu), MENU_TIMEOUT)
 
-    for w in mood_keywords[mood]:
-        if w.lower() in name.lower():
-            return 1
-    return 0
 
+# Popularity only nudges scores, so on failure we score without it.
+# Counts come from Redis; the orders table is only read by the
+# background refresh in redis_cache. Returns (counts, version)
+async def load_popularity(branch):
+    try:
+        with STAGE_SECONDS.time("popularity_load"):
+            return await asyncio.wait_for(get_popularity(branch, fetch_recent_orders), CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("popularity fetch failed for branch %s: %s", branch, e)
+        return {}, "none"
 
-# Spice scoring
-def spice_match(name, spice):
-    levels = {
-        "low": ["mild", "light"],
-        "medium": ["regular", "medium"],
-        "high": ["hot", "spicy"]
-    }
 
-    if spice not in levels:
-        return 0
+# Menu and popularity are independent, so load them concurrently
+async def load_branch_data(branch):
+    menu, popularity = await asyncio.gather(
+        load_menu(branch),
+        load_popularity(branch),
+        return_exceptions=True
+    )
 
-    for w in levels[spice]:
-        if w.lower() in name.lower():
-            return 1
-    return 0
+    if isinstance(menu, BaseException):
+        raise HTTPException(status_code=503, detail=f"Menu unavailable for branch {branch}: {menu!r}")
+    if isinstance(popularity, BaseException):
+        popularity = ({}, "none")
 
+    return menu, popularity
 
-# Build a single deal
-def build_deal(scored, peoples, ideal_budget, hard_budget, cat_priority, shift=0):
 
-    grouped = {}
-    for item in scored:
-        cat = item["category"]
-        if cat not in grouped:
-            grouped[cat] = []
-        grouped[cat].append(item)
+# Build a single deal from the top scored item of each category
+def build_deal(best_by_category, peoples, ideal_budget, hard_budget, cat_priority, shift=0):
 
     deal = []
     total_cost = 0
@@ -135,10 +171,10 @@ def build_deal(scored, peoples, ideal_budget, hard_budget, cat_priority, shift=0
     priority = cat_priority[shift:] + cat_priority[:shift]
 
     for cat in priority:
-        if cat not in grouped:
+        if cat not in best_by_category:
             continue
 
-        best = grouped[cat][0]
+        best = best_by_category[cat]
 
         qty = peoples
         cost = qty * best["price"]
@@ -162,54 +198,41 @@ def build_deal(scored, peoples, ideal_budget, hard_budget, cat_priority, shift=0
     return deal, total_cost
 
 
-@router.post("/recommend")
-async def recommend_local(payload: InputPayload):
-
-    q = payload.question
-    branch = payload.branch
+# Response for one question, given the branch's loaded data
+def build_response(branch, q, index, popularity):
 
     min_budget, ideal_budget, hard_budget = get_budget_range(q.peoples, q.budget, q.mood)
 
-    menu = await get_menu_from_cache(branch)
-    if not menu:
-        menu = await fetch_menu(branch)
-        await store_menu_in_cache(branch, menu)
-
-    popularity = await fetch_recent_orders(branch)
-
-    # Apply avoid filter
-    filtered = []
-    for item in menu:
-        if q.avoid_anything.lower() in item["name"].lower():
-            continue
-        filtered.append(item)
-
-    # Scoring
-    scored = []
-    for item in filtered:
-        score = (
-            mood_match(item["name"], q.mood) * 2 +
-            spice_match(item["name"], q.spice_lvl) * 3 +
-            popularity.get(item["name"], 0)
-        )
-
-        scored.append({
-            "name": item["name"],
-            "category": item["category"],
-            "portion": item["portion"],
-            "price": item["price"],
-            "score": score
-        })
-
-    scored = sorted(scored, key=lambda x: x["score"], reverse=True)
-
     # Decide category priority based on meal time
     cat_priority = MEAL_PRIORITY.get(q.meal_time, DEFAULT_PRIORITY)
 
-    # Generate 3 unique deals
-    deal1, cost1 = build_deal(scored, q.peoples, ideal_budget, hard_budget, cat_priority, shift=0)
-    deal2, cost2 = build_deal(scored, q.peoples, ideal_budget, hard_budget, cat_priority, shift=2)
-    deal3, cost3 = build_deal(scored, q.peoples, ideal_budget, hard_budget, cat_priority, shift=4)
+    # Avoid filter + scoring over the branch's precomputed index
+    # (vectorized for large menus when NumPy is installed)
+    if DEAL_ENGINE == "greedy":
+        with STAGE_SECONDS.time("scoring"):
+            best = best_by_category(index, q.mood, q.spice_lvl, q.avoid_anything, popularity)
+        with STAGE_SECONDS.time("deal_building"):
+            deals = [
+                build_deal(best, q.peoples, ideal_budget, hard_budget, cat_priority, shift=shift)
+                for shift in (0, 2, 4)
+            ]
+    else:
+        # Top 3 distinct deals from one knapsack pass
+        with STAGE_SECONDS.time("scoring"):
+            scores, allowed = score_items(index, q.mood, q.spice_lvl, q.avoid_anything, popularity)
+        with STAGE_SECONDS.time("deal_building"):
+            deals = best_deals(index, scores, allowed, q.peoples, ideal_budget, hard_budget, cat_priority, k=3)
+            # a tight budget can leave fewer than 3 feasible selections;
+            # the missing slots get the greedy deals (new ones first), so
+            # there are always deals 1..3 as before
+            if len(deals) < 3:
+                best = best_by_category(index, q.mood, q.spice_lvl, q.avoid_anything, popularity)
+                greedy = [
+                    build_deal(best, q.peoples, ideal_budget, hard_budget, cat_priority, shift=shift)
+                    for shift in (0, 2, 4)
+                ]
+                fresh = [deal for deal in greedy if deal not in deals]
+                deals += (fresh + greedy)[:3 - len(deals)]
 
     return {
         "branch": branch,
@@ -219,8 +242,91 @@ async def recommend_local(payload: InputPayload):
         "budget_type": q.budget,
         "budget_limit": hard_budget,
         "deals": [
-            {"deal_number": 1, "items": deal1, "total_cost": cost1},
-            {"deal_number": 2, "items": deal2, "total_cost": cost2},
-            {"deal_number": 3, "items": deal3, "total_cost": cost3}
+            {"deal_number": n, "items": items, "total_cost": cost}
+            for n, (items, cost) in enumerate(deals, start=1)
         ]
     }
+
+
+@router.post("/recommend")
+async def recommend_local(payload: InputPayload):
+
+    q = payload.question
+    branch = payload.branch
+
+    menu, (popularity, popularity_version) = await load_branch_data(branch)
+    with STAGE_SECONDS.time("menu_index"):
+        index = get_menu_index(branch, menu)
+
+    # Same question against the same menu and popularity snapshot -> same answer
+    cache_key = response_key(branch, q, index.version, popularity_version, ANSWER_CONFIG)
+    with STAGE_SECONDS.time("response_cache"):
+        cached = await get_cached_response(cache_key)
+    if cached is not None:
+        return cached
+
+    # inline for typical menus; very large ones go to the compute pool
+    (response,) = await run_job(build_response, branch, index, popularity, popularity_version, [q])
+    if isinstance(response, Exception):
+        raise response
+    await store_cached_response(cache_key, response)
+    return response
+
+
+# Many questions, possibly for many branches, in one call. Each distinct
+# branch is loaded once and identical questions are answered once.
+# Results come back in input order; a failure only affects its own entry
+@router.post("/recommend/batch")
+async def recommend_batch(payloads: List[InputPayload]):
+
+    if len(payloads) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} questions per batch")
+
+    branches = list(dict.fromkeys(p.branch for p in payloads))
+    # menus and popularity for every branch in one Redis round trip
+    with STAGE_SECONDS.time("menu_load"):
+        branch_data = await get_branches(branches, fetch_menu, fetch_recent_orders, MENU_TIMEOUT)
+
+    # First pass: the response key of every answerable question
+    keys = {}
+    results = {}
+    for i, payload in enumerate(payloads):
+        data = branch_data[payload.branch]
+        if isinstance(data, BaseException):
+            results[i] = {"index": i, "ok": False, "error": f"Menu unavailable for branch {payload.branch}: {data!r}"}
+            continue
+        menu, (popularity, popularity_version) = data
+        index = get_menu_index(payload.branch, menu)
+        keys[i] = response_key(payload.branch, payload.question, index.version, popularity_version, ANSWER_CONFIG)
+
+    # Every cached answer in one lookup; the rest are built once per
+    # distinct key and written back in one pipeline
+    with STAGE_SECONDS.time("response_cache"):
+        answered = await get_cached_responses(list(dict.fromkeys(keys.values())))
+    # One scoring job per branch over its distinct unanswered questions;
+    # big jobs are split across the compute pool
+    todo = {}
+    for i, key in keys.items():
+        if key not in answered:
+            todo.setdefault(payloads[i].branch, {}).setdefault(key, payloads[i].question)
+
+    async def build_branch(branch, questions):
+        menu, (popularity, popularity_version) = branch_data[branch]
+        index = get_menu_index(branch, menu)
+        built = await run_job(build_response, branch, index, popularity, popularity_version, list(questions.values()))
+        return dict(zip(questions, built))
+
+    built = {}
+    for part in await asyncio.gather(*(build_branch(b, qs) for b, qs in todo.items())):
+        built.update(part)
+
+    for i, key in keys.items():
+        response = answered.get(key, built.get(key))
+        if isinstance(response, Exception):
+            logger.warning("batch item %d failed: %s", i, response)
+            results[i] = {"index": i, "ok": False, "error": repr(response)}
+        else:
+            results[i] = {"index": i, "ok": True, "result": response}
+
+    await store_cached_responses({k: r for k, r in built.items() if not isinstance(r, Exception)})
+    return {"results": [results[i] for i in range(len(payloads))]}
@@ -1,6 +1,17 @@
 import redis.asyncio as redis
+import asyncio
+import hashlib
 import json
+import logging
 import os
+import time
+import uuid
+
+from cache_keys import MENU, POPULARITY, RESPONSE, cache_key, daily_popularity_key, legacy_keys, lock_key, menu_key, popularity_key
+from local_cache import LocalCache, freeze_menu
+from menu_codec import decode_menu, encode_menu
+from menu_index import get_menu_index, put_menu_index
+from metrics import CACHE_REQUESTS, register_local_cache
 
 redis_client = redis.Redis(
     host=os.getenv("REDIS_HOST", "localhost"),
@@ -8,17 +19,471 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# Same server, but returns bytes: menu entries may be binary (menu_codec)
+redis_bytes_client = redis.Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    decode_responses=False
+)
+
 TTL = int(os.getenv("REDIS_TTL", 300))
 
+# A Redis read slower than this is treated as a miss
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", 0.2))
+
+# Menus older than TTL are "stale": still served for up to MENU_STALE_TTL
+# more seconds while one background task reloads them
+MENU_STALE_TTL = int(os.getenv("MENU_STALE_TTL", 600))
+# Cross-process single-flight lock for menu loads
+MENU_LOCK_TTL = int(os.getenv("MENU_LOCK_TTL", 10))
+# How long a process that lost the lock waits for the winner's result
+MENU_LOCK_WAIT = float(os.getenv("MENU_LOCK_WAIT", 2.0))
+
+# In-process tier in front of Redis: decoded, read-only menus per branch.
+# Pub/sub invalidation keeps it fresh; the TTL bounds staleness if a
+# message is ever missed
+LOCAL_MENU_CACHE_SIZE = int(os.getenv("LOCAL_MENU_CACHE_SIZE", 256))
+LOCAL_MENU_CACHE_TTL = float(os.getenv("LOCAL_MENU_CACHE_TTL", 60))
+MENU_INVALIDATION_CHANNEL = cache_key("menu_invalidate")
+
+# Popularity counts: kept in Redis for POPULARITY_TTL, but refreshed in
+# the background once they are older than POPULARITY_REFRESH
+POPULARITY_TTL = int(os.getenv("POPULARITY_TTL", 3600))
+POPULARITY_REFRESH = int(os.getenv("POPULARITY_REFRESH", 300))
+# Upper bound on one refresh; also the lifetime of the cross-process lock
+POPULARITY_LOCK_TTL = int(os.getenv("POPULARITY_LOCK_TTL", 30))
+# Short in-process tier so hot branches don't read Redis on every request
+LOCAL_POPULARITY_CACHE_TTL = float(os.getenv("LOCAL_POPULARITY_CACHE_TTL", 5))
+
+# Whole /recommend responses (see response_cache)
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 600))
+
+logger = logging.getLogger(__name__)
+
+# branch -> in-flight refresh task (one per branch per process)
+_popularity_refreshing = {}
+_menu_loading = {}
+# keeps fire-and-forget tasks referenced until they finish
+_background_tasks = set()
+
+local_menu_cache = LocalCache(LOCAL_MENU_CACHE_SIZE, LOCAL_MENU_CACHE_TTL)
+local_popularity_cache = LocalCache(LOCAL_MENU_CACHE_SIZE, LOCAL_POPULARITY_CACHE_TTL)
+register_local_cache("menu", local_menu_cache)
+register_local_cache("popularity", local_popularity_cache)
+
+# lets the listener skip invalidations this process published itself
+PROCESS_ID = uuid.uuid4().hex
+
+# Deletes a lock only while it still holds the caller's token, so a holder
+# that outlived the lock's TTL can't release whoever took it over
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# branch -> (menu, MenuIndex) inherited from a pre-fork master
+# (cache_warmer.preload_caches)
+_shared_menus = {}
+
+
+def _menu_payload(branch, menu, fetched_at):
+    return encode_menu(menu, fetched_at, get_menu_index(branch, menu))
+
+
+# Menus the master built before forking this worker; see _shared_menu
+def share_menus(menus):
+    _shared_menus.clear()
+    _shared_menus.update({branch: (menu, get_menu_index(branch, menu)) for branch, menu in menus.items()})
+
+
+# A menu read from Redis (or reloaded) that the master already held is
+# swapped for the master's copy, so workers keep sharing those pages
+# after the local tier expires instead of each decoding a private one
+def _shared_menu(branch, menu, index=None):
+    shared = _shared_menus.get(branch)
+    if shared is None:
+        return menu
+    version = index.version if index is not None else get_menu_index(branch, menu).version
+    if version != shared[1].version:
+        return menu
+    put_menu_index(branch, *shared)
+    return shared[0]
+
 
-async def get_menu_from_cache(branch):
-    key = f"menu:{branch}"
-    data = await redis_client.get(key)
-    if data:
-        return json.loads(data)
-    return None
+# "<sender>:<branch>:<menu version>"; the version is empty for deletes
+def _invalidation_message(branch, version=""):
+    return f"{PROCESS_ID}:{branch}:{version}"
+
+
+def _popularity_payload(counts, fetched_at):
+    return json.dumps({"counts": counts, "fetched_at": fetched_at, "version": popularity_version(counts)})
+
+
+def _decode_entry(kind, ident, data):
+    if kind == MENU:
+        # binary entries carry the scoring index; cache it for this menu
+        menu, fetched_at, index = decode_menu(data)
+        if index is not None:
+            put_menu_index(ident, menu, index)
+        return _shared_menu(ident, menu, index), fetched_at
+    entry = json.loads(data)
+    if kind == POPULARITY:
+        version = entry.get("version") or popularity_version(entry["counts"])
+        return entry["counts"], entry["fetched_at"], version
+    return entry
+
+
+# One MGET for any mix of cached data: menus and popularity by branch,
+# responses by key. Returns {kind: {branch or key: value}} with hits only:
+#   menu -> (menu, fetched_at), popularity -> (counts, fetched_at, version),
+#   response -> response
+# Menus and popularity are also looked up under their legacy names in the
+# same round trip; such hits are copied to the new names in the background
+async def get_many(menus=(), popularity=(), responses=()):
+    wanted = [(MENU, b) for b in menus] + [(POPULARITY, b) for b in popularity] + [(RESPONSE, k) for k in responses]
+    lookups = [
+        [ident] if kind == RESPONSE else [cache_key(kind, ident)] + legacy_keys(kind, ident)
+        for kind, ident in wanted
+    ]
+    found = {MENU: {}, POPULARITY: {}, RESPONSE: {}}
+    if not wanted:
+        return found
+
+    values = iter(await redis_bytes_client.mget([key for keys in lookups for key in keys]))
+    legacy = {MENU: {}, POPULARITY: {}}
+    for (kind, ident), keys in zip(wanted, lookups):
+        hits = [next(values) for _ in keys]
+        for i, data in enumerate(hits):
+            if not data:
+                continue
+            try:
+                found[kind][ident] = _decode_entry(kind, ident, data)
+            except Exception as e:
+                logger.warning("unreadable cache entry %s: %s", keys[i], e)
+                continue
+            if i > 0:
+                legacy[kind][ident] = found[kind][ident]
+            break
+
+    if legacy[MENU] or legacy[POPULARITY]:
+        _run_in_background(_copy_legacy(legacy))
+    return found
+
+
+async def _copy_legacy(legacy):
+    # keeps each entry's fetched_at, so stale legacy entries stay stale
+    try:
+        async with redis_bytes_client.pipeline(transaction=False) as pipe:
+            for branch, (menu, fetched_at) in legacy[MENU].items():
+                pipe.set(menu_key(branch), _menu_payload(branch, menu, fetched_at), ex=TTL + MENU_STALE_TTL)
+            for branch, (counts, fetched_at, _) in legacy[POPULARITY].items():
+                pipe.set(popularity_key(branch), _popularity_payload(counts, fetched_at), ex=POPULARITY_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning("copying legacy cache entries failed: %s", e)
+
+
+# One pipeline for any mix of writes: menus {branch: menu}, popularity
+# {branch: counts}, responses {key: response}. Written menus also go to
+# the local tier, and other processes drop their copies
+async def set_many(menus=None, popularity=None, responses=None):
+    now = time.time()
+    menus = {branch: _shared_menu(branch, freeze_menu(data)) for branch, data in (menus or {}).items()}
+    popularity = popularity or {}
+
+    async with redis_bytes_client.pipeline(transaction=False) as pipe:
+        for branch, menu in menus.items():
+            pipe.set(menu_key(branch), _menu_payload(branch, menu, now), ex=TTL + MENU_STALE_TTL)
+            pipe.publish(MENU_INVALIDATION_CHANNEL, _invalidation_message(branch, get_menu_index(branch, menu).version))
+        for branch, counts in popularity.items():
+            pipe.set(popularity_key(branch), _popularity_payload(counts, now), ex=POPULARITY_TTL)
+        for key, response in (responses or {}).items():
+            pipe.set(key, json.dumps(response), ex=RESPONSE_CACHE_TTL)
+        await pipe.execute()
+
+    for branch, menu in menus.items():
+        local_menu_cache.set(branch, menu)
+    for branch in popularity:
+        local_popularity_cache.pop(branch)
+
+
+async def _release_lock(lock, token):
+    try:
+        await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock, token)
+    except Exception as e:
+        logger.warning("could not release %s: %s", lock, e)
+
+
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _read_menu(branch):
+    # Returns (menu, fetched_at) from Redis, or None
+    return (await get_many(menus=[branch]))[MENU].get(branch)
 
 
 async def store_menu_in_cache(branch, data):
-    key = f"menu:{branch}"
-    await redis_client.set(key, json.dumps(data), ex=TTL)
+    await set_many(menus={branch: data})
+
+
+async def _load_menu_once(branch, loader):
+    lock = lock_key(MENU, branch)
+    token = uuid.uuid4().hex
+    try:
+        locked = await redis_client.set(lock, token, nx=True, ex=MENU_LOCK_TTL)
+        wait = not locked
+    except Exception as e:
+        logger.warning("menu lock unavailable for branch %s: %s", branch, e)
+        locked = wait = False
+
+    # Another process is loading this branch: wait for its result, and
+    # load it ourselves only if it doesn't show up in time
+    deadline = time.monotonic() + MENU_LOCK_WAIT
+    while wait and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        try:
+            cached = await asyncio.wait_for(_read_menu(branch), CACHE_TIMEOUT)
+        except Exception:
+            break
+        if cached and time.time() - cached[1] <= TTL:
+            local_menu_cache.set(branch, cached[0])
+            return cached[0]
+
+    try:
+        menu = _shared_menu(branch, freeze_menu(await loader(branch)))
+        try:
+            await store_menu_in_cache(branch, menu)
+        except Exception as e:
+            logger.warning("menu cache store failed for branch %s: %s", branch, e)
+        return menu
+    finally:
+        if locked:
+            await _release_lock(lock, token)
+
+
+def _start_menu_load(branch, loader):
+    task = _menu_loading.get(branch)
+    if task is None:
+        task = asyncio.create_task(_load_menu_once(branch, loader))
+        _menu_loading[branch] = task
+        task.add_done_callback(lambda _: _menu_loading.pop(branch, None))
+    return task
+
+
+# What to serve for a Redis menu entry: fresh ones go to the local tier,
+# stale ones are served while a single background task refreshes them
+def _use_cached_menu(branch, cached, loader):
+    menu, fetched_at = cached
+    if time.time() - fetched_at > TTL:
+        CACHE_REQUESTS.inc("menu", "stale")
+        _start_menu_load(branch, loader)
+    else:
+        CACHE_REQUESTS.inc("menu", "hit")
+        local_menu_cache.set(branch, menu)
+    return menu
+
+
+# Local tier, then Redis, then `loader` (e.g. fetch_menu). Concurrent
+# misses for a branch share one load per process and, through the Redis
+# lock, one load across processes. Stale entries are returned at once
+# while a single background task refreshes them
+async def get_menu(branch, loader):
+    menu = local_menu_cache.get(branch)
+    if menu is not None:
+        return menu
+
+    try:
+        cached = await asyncio.wait_for(_read_menu(branch), CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("menu cache lookup failed for branch %s: %s", branch, e)
+        CACHE_REQUESTS.inc("menu", "error")
+        cached = None
+
+    if cached:
+        return _use_cached_menu(branch, cached, loader)
+
+    CACHE_REQUESTS.inc("menu", "miss")
+    # shield: a caller timing out must not cancel the load others share
+    return await asyncio.shield(_start_menu_load(branch, loader))
+
+
+# Call after a menu is edited: every process drops its copy. Legacy
+# names go too, or a read could copy an old entry back
+async def invalidate_menu(branch):
+    await redis_client.delete(menu_key(branch), *legacy_keys(MENU, branch))
+    local_menu_cache.pop(branch)
+    await redis_client.publish(MENU_INVALIDATION_CHANNEL, _invalidation_message(branch))
+
+
+async def listen_for_menu_invalidations():
+    subscribed = False
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(MENU_INVALIDATION_CHANNEL)
+                # anything published while we were disconnected is lost;
+                # the first subscribe keeps what start-up just loaded
+                if subscribed:
+                    local_menu_cache.clear()
+                subscribed = True
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    sender, branch, version = (message["data"].split(":") + [""])[:3]
+                    if sender != PROCESS_ID:
+                        _drop_local_menu(int(branch), version)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("menu invalidation listener error, reconnecting: %s", e)
+            await asyncio.sleep(1)
+
+
+# A copy that already has the published version is kept, so a refresh
+# that didn't change anything doesn't cost every process a reload
+def _drop_local_menu(branch, version):
+    menu = local_menu_cache.pop(branch)
+    if menu is not None and version and get_menu_index(branch, menu).version == version:
+        local_menu_cache.set(branch, menu)
+
+
+# Content stamp of a popularity snapshot: changes only when counts do
+def popularity_version(counts):
+    return hashlib.sha1(json.dumps(counts, sort_keys=True).encode()).hexdigest()[:12]
+
+
+async def get_popularity_from_cache(branch):
+    # Returns (counts, fetched_at, version), or None
+    return (await get_many(popularity=[branch]))[POPULARITY].get(branch)
+
+
+async def store_popularity_in_cache(branch, counts):
+    await set_many(popularity={branch: counts})
+
+
+async def _refresh_popularity(branch, loader):
+    # Only one process recomputes a branch at a time; the others keep
+    # serving the cached counts
+    lock = lock_key(POPULARITY, branch)
+    token = uuid.uuid4().hex
+    locked = False
+    try:
+        locked = await redis_client.set(lock, token, nx=True, ex=POPULARITY_LOCK_TTL)
+        if not locked:
+            return
+        counts = await asyncio.wait_for(loader(branch), POPULARITY_LOCK_TTL)
+        await store_popularity_in_cache(branch, counts)
+    except Exception as e:
+        logger.warning("popularity refresh failed for branch %s: %s", branch, e)
+    finally:
+        if locked:
+            await _release_lock(lock, token)
+
+
+def refresh_popularity_in_background(branch, loader):
+    task = _popularity_refreshing.get(branch)
+    if task is None:
+        task = asyncio.create_task(_refresh_popularity(branch, loader))
+        _popularity_refreshing[branch] = task
+        task.add_done_callback(lambda _: _popularity_refreshing.pop(branch, None))
+    return task
+
+
+# Returns (counts, version). Never runs `loader` on the caller's path: a
+# cold branch gets {} until the first background refresh lands, a stale
+# one gets its old counts
+async def get_popularity(branch, loader):
+    cached = local_popularity_cache.get(branch)
+    if cached is None:
+        cached = await get_popularity_from_cache(branch)
+        return _use_cached_popularity(branch, cached, loader)
+    return _use_popularity(branch, cached, loader)
+
+
+# (counts, version) to serve for a Redis popularity entry (or None)
+def _use_cached_popularity(branch, cached, loader):
+    if cached is None:
+        CACHE_REQUESTS.inc("popularity", "miss")
+        refresh_popularity_in_background(branch, loader)
+        return {}, "none"
+    CACHE_REQUESTS.inc("popularity", "hit")
+    local_popularity_cache.set(branch, cached)
+    return _use_popularity(branch, cached, loader)
+
+
+def _use_popularity(branch, cached, loader):
+    counts, fetched_at, version = cached
+    if time.time() - fetched_at > POPULARITY_REFRESH:
+        refresh_popularity_in_background(branch, loader)
+    return counts, version
+
+
+# Menus and popularity for many branches at once: whatever the local
+# tiers don't have comes from Redis in one round trip. Misses and stale
+# entries go through the same single-flight loads and refreshes as
+# get_menu / get_popularity. Returns {branch: (menu, (counts, version))},
+# with the exception instead for branches whose menu couldn't be loaded
+async def get_branches(branches, menu_loader, popularity_loader, menu_timeout):
+    menus = {}
+    popularity = {}
+    for branch in branches:
+        menu = local_menu_cache.get(branch)
+        if menu is not None:
+            menus[branch] = menu
+        cached = local_popularity_cache.get(branch)
+        if cached is not None:
+            popularity[branch] = _use_popularity(branch, cached, popularity_loader)
+
+    need_menus = [b for b in branches if b not in menus]
+    need_popularity = [b for b in branches if b not in popularity]
+    found = {MENU: {}, POPULARITY: {}}
+    if need_menus or need_popularity:
+        try:
+            found = await asyncio.wait_for(get_many(menus=need_menus, popularity=need_popularity), CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning("bulk cache lookup failed for %d branches: %s", len(branches), e)
+            CACHE_REQUESTS.inc("menu", "error", amount=len(need_menus))
+
+    for branch in need_popularity:
+        popularity[branch] = _use_cached_popularity(branch, found[POPULARITY].get(branch), popularity_loader)
+
+    loads = {}
+    for branch in need_menus:
+        cached = found[MENU].get(branch)
+        if cached:
+            menus[branch] = _use_cached_menu(branch, cached, menu_loader)
+        else:
+            CACHE_REQUESTS.inc("menu", "miss")
+            loads[branch] = asyncio.wait_for(asyncio.shield(_start_menu_load(branch, menu_loader)), menu_timeout)
+
+    loaded = await asyncio.gather(*loads.values(), return_exceptions=True)
+    menus.update(zip(loads, loaded))
+
+    return {
+        branch: menus[branch] if isinstance(menus[branch], BaseException) else (menus[branch], popularity[branch])
+        for branch in branches
+    }
+
+
+# Live mirror of the order_item_daily rollup: one sorted set per branch
+# per day, member = item name, score = orders that day
+POPULARITY_DAYS = int(os.getenv("POPULARITY_DAYS", 30))
+
+
+async def record_daily_popularity(daily):
+    # daily: {(branch, item_name, day): n}, as returned by insert_orders
+    async with redis_client.pipeline(transaction=False) as pipe:
+        keys = set()
+        for (branch, item_name, day), n in daily.items():
+            key = daily_popularity_key(branch, day)
+            pipe.zincrby(key, n, item_name)
+            keys.add(key)
+        for key in keys:
+            pipe.expire(key, (POPULARITY_DAYS + 1) * 86400)
+        await pipe.execute()
@@ -16,3 +16,11 @@ payload = {
 resp = requests.post("http://localhost:8004/api/recommend", json=payload)
 print(resp.status_code)
 print(resp.text)
+
+# Zero or negative party sizes must still get 200 and deals 1..3
+for peoples in (0, -2):
+    payload["question"]["peoples"] = peoples
+    resp = requests.post("http://localhost:8004/api/recommend", json=payload)
+    print(peoples, resp.status_code)
+    assert resp.status_code == 200, resp.text
+    assert [d["deal_number"] for d in resp.json()["deals"]] == [1, 2, 3]
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from cache_keys import RESPONSE, cache_key
+from local_cache import LocalCache
+from metrics import CACHE_REQUESTS, register_local_cache
+from redis_cache import CACHE_TIMEOUT, get_many, set_many
+
+logger = logging.getLogger(__name__)
+
+# Whole /recommend responses. Keys embed the menu and popularity version
+# stamps and a stamp of the scoring/deal settings, so a new menu, a new
+# popularity snapshot or a config change simply stops matching old
+# entries; nothing has to be deleted
+LOCAL_RESPONSE_CACHE_SIZE = int(os.getenv("LOCAL_RESPONSE_CACHE_SIZE", 4096))
+LOCAL_RESPONSE_CACHE_TTL = float(os.getenv("LOCAL_RESPONSE_CACHE_TTL", 60))
+
+local_response_cache = LocalCache(LOCAL_RESPONSE_CACHE_SIZE, LOCAL_RESPONSE_CACHE_TTL)
+register_local_cache("response", local_response_cache)
+
+
+# Canonical form of a question. Only avoid_anything is matched
+# case-insensitively by the scorer, so only it is lowercased here
+def question_hash(question):
+    fields = question.model_dump()
+    fields["avoid_anything"] = fields["avoid_anything"].lower()
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+# Stamp of the settings an answer was computed under, for response_key
+def config_version(*settings):
+    canonical = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+
+def response_key(branch, question, menu_version, popularity_version, config):
+    return cache_key(RESPONSE, branch, menu_version, popularity_version, config, question_hash(question))
+
+
+# {key: response} for the keys found locally or in Redis (one MGET for
+# all the local misses)
+async def get_cached_responses(keys):
+    found = {}
+    for key in keys:
+        response = local_response_cache.get(key)
+        if response is not None:
+            found[key] = response
+
+    missing = [key for key in keys if key not in found]
+    if not missing:
+        return found
+    try:
+        cached = await asyncio.wait_for(get_many(responses=missing), CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("response cache lookup failed: %s", e)
+        CACHE_REQUESTS.inc("response", "error", amount=len(missing))
+        return found
+
+    hits = cached[RESPONSE]
+    CACHE_REQUESTS.inc("response", "hit", amount=len(hits))
+    CACHE_REQUESTS.inc("response", "miss", amount=len(missing) - len(hits))
+    for key, response in hits.items():
+        local_response_cache.set(key, response)
+    found.update(hits)
+    return found
+
+
+# Writes {key: response} to both tiers, Redis in one pipeline
+async def store_cached_responses(responses):
+    for key, response in responses.items():
+        local_response_cache.set(key, response)
+    if not responses:
+        return
+    try:
+        await asyncio.wait_for(set_many(responses=responses), CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("response cache store failed: %s", e)
+
+
+async def get_cached_response(key):
+    return (await get_cached_responses([key])).get(key)
+
+
+async def store_cached_response(key, response):
+    await store_cached_responses({key: response})
@@ -0,0 +1,111 @@
+import os
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python MenuIndex is the fallback
+    np = None
+
+from menu_index import MOOD_BITS, SPICE_BITS
+
+HAS_NUMPY = np is not None
+
+# "python", "numpy", or "auto" (numpy for menus of NUMPY_MIN_ITEMS or more)
+SCORING_BACKEND = os.getenv("SCORING_BACKEND", "auto")
+NUMPY_MIN_ITEMS = int(os.getenv("NUMPY_MIN_ITEMS", 200))
+
+
+# Column-wise copy of a MenuIndex. Gives the same answers as
+# MenuIndex.best_by_category, computed with array ops
+class NumpyMenuIndex:
+
+    def __init__(self, index):
+        self.index = index
+        n = len(index.items)
+
+        self.prices = np.array([item["price"] for item in index.items], dtype=np.int64)
+        self.mood_masks = np.array(index.mood_masks, dtype=np.int64)
+        self.spice_masks = np.array(index.spice_masks, dtype=np.int64)
+        self.names_lower = np.array(index.names_lower, dtype=str) if n else np.array([], dtype=str)
+
+        # categories numbered in order of first appearance
+        self.categories = list(index.categories)
+        cat_ids = {cat: i for i, cat in enumerate(self.categories)}
+        self.category_ids = np.array([cat_ids[item["category"]] for item in index.items], dtype=np.int64)
+
+        # popularity is keyed by name; names may repeat across categories
+        positions = {}
+        for i, item in enumerate(index.items):
+            positions.setdefault(item["name"], []).append(i)
+        self.name_positions = {name: np.array(pos) for name, pos in positions.items()}
+        self.positions = np.arange(n)
+
+    def scores(self, mood, spice, popularity):
+        mood_bit = MOOD_BITS.get(mood, 0)
+        spice_bit = SPICE_BITS.get(spice, 0)
+
+        pop = np.zeros(len(self.prices), dtype=np.int64)
+        for name, cnt in popularity.items():
+            pos = self.name_positions.get(name)
+            if pos is not None:
+                pop[pos] = cnt
+
+        return (
+            2 * ((self.mood_masks & mood_bit) != 0) +
+            3 * ((self.spice_masks & spice_bit) != 0) +
+            pop
+        )
+
+    def allowed(self, avoid):
+        return np.char.find(self.names_lower, avoid.lower()) < 0
+
+    def best_by_category(self, mood, spice, avoid, popularity):
+        if not len(self.prices):
+            return {}
+
+        scores = self.scores(mood, spice, popularity)
+        allowed = self.allowed(avoid)
+
+        # Sort by category, then score (desc), then menu position, and keep
+        # the first allowed row of each category
+        masked = np.where(allowed, scores.astype(np.float64), -np.inf)
+        order = np.lexsort((self.positions, -masked, self.category_ids))
+        cats = self.category_ids[order]
+        first = order[np.concatenate(([True], cats[1:] != cats[:-1]))]
+        first = first[allowed[first]]
+
+        return {
+            self.categories[self.category_ids[i]]: self.index.scored_item(int(i), int(scores[i]))
+            for i in first
+        }
+
+
+def use_numpy(index):
+    if not HAS_NUMPY or SCORING_BACKEND == "python":
+        return False
+    if SCORING_BACKEND == "numpy":
+        return True
+    return len(index) >= NUMPY_MIN_ITEMS
+
+
+def get_numpy_index(index):
+    # built lazily and kept on the MenuIndex, so it lives exactly as long
+    # as the cached menu it was built from
+    numpy_index = index.numpy_index
+    if numpy_index is None:
+        numpy_index = NumpyMenuIndex(index)
+        index.numpy_index = numpy_index
+    return numpy_index
+
+
+def best_by_category(index, mood, spice, avoid, popularity):
+    if use_numpy(index):
+        return get_numpy_index(index).best_by_category(mood, spice, avoid, popularity)
+    return index.best_by_category(mood, spice, avoid, popularity)
+
+
+# Per-item (scores, allowed) from whichever backend fits this menu
+def score_items(index, mood, spice, avoid, popularity):
+    if use_numpy(index):
+        numpy_index = get_numpy_index(index)
+        return numpy_index.scores(mood, spice, popularity), numpy_index.allowed(avoid)
+    return index.scores(mood, spice, popularity), index.allowed(avoid)
@@ -0,0 +1,5 @@
+-- Menu lookups filter on branch and group/sort by category and price
+CREATE INDEX idx_menu_branch_category_price ON menu (branch, category, price);
+
+-- Popularity windows filter on branch + order_date and group by item_name
+CREATE INDEX idx_orders_branch_date_item ON orders (branch, order_date, item_name);
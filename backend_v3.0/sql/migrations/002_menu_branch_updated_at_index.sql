@@ -0,0 +1,3 @@
+-- The menu watcher reads MAX(updated_at) and COUNT(*) per branch every few
+-- seconds; this index answers it without touching the table rows
+CREATE INDEX idx_menu_branch_updated ON menu (branch, updated_at);
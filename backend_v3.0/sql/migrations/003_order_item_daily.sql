@@ -0,0 +1,16 @@
+-- Per-branch, per-item, per-day order counts, maintained by POST /api/orders
+-- and read by the popularity refresh instead of scanning orders
+CREATE TABLE IF NOT EXISTS order_item_daily (
+  branch INT NOT NULL,
+  item_name VARCHAR(255) NOT NULL,
+  order_day DATE NOT NULL,
+  cnt INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (branch, order_day, item_name)
+);
+
+-- Backfill from existing orders. Counts are recomputed, not added, so
+-- rows already written by POST /api/orders end up correct too
+INSERT INTO order_item_daily (branch, item_name, order_day, cnt)
+SELECT branch, item_name, DATE(order_date), COUNT(*) FROM orders
+GROUP BY branch, item_name, DATE(order_date)
+ON DUPLICATE KEY UPDATE cnt = VALUES(cnt);
@@ -18,6 +18,15 @@ CREATE TABLE IF NOT EXISTS orders (
   order_date DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Per-branch, per-item, per-day order counts, maintained by POST /api/orders
+CREATE TABLE IF NOT EXISTS order_item_daily (
+  branch INT NOT NULL,
+  item_name VARCHAR(255) NOT NULL,
+  order_day DATE NOT NULL,
+  cnt INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (branch, order_day, item_name)
+);
+
 
 -- Sample Menu Data for Branch 1
 INSERT INTO menu (branch, name, category, portion, price) VALUES
@@ -42,3 +51,9 @@ INSERT INTO orders (branch, item_name) VALUES
 (1, 'Veggie Burger'),
 (1, 'Caesar Salad'),
 (1, 'Spicy Chicken Wings');
+
+-- Backfill the rollup from existing orders
+INSERT INTO order_item_daily (branch, item_name, order_day, cnt)
+SELECT branch, item_name, DATE(order_date), COUNT(*) FROM orders
+GROUP BY branch, item_name, DATE(order_date)
+ON DUPLICATE KEY UPDATE cnt = VALUES(cnt);
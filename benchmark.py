@@ -0,0 +1,818 @@
+# Reproducible latency / throughput benchmark for the recommend services.
+#
+# Runs a backend's FastAPI app in-process against in-process fakes of MySQL,
+# Redis and the Groq API, fed with a synthetic menu and order history, and
+# prints one JSON document so versions can be compared side by side:
+#
+#   python benchmark.py --target backend_v3.0
+#   python benchmark.py --target all --requests 5000 --concurrency 100 > bench.json
+#   python benchmark.py --target backend_v3.0 --workers 1,2,4 --distinct-questions 5000
+#
+# Fake MySQL charges --db-latency-ms per query plus --db-row-cost-us per row
+# a real server would have to scan, so a GROUP BY over the orders table
+# costs more than a read of the daily rollup. Fake Redis charges
+# --redis-latency-ms per command, fake Groq --llm-latency-ms per completion.
+# Request latencies include the in-process HTTP stack (httpx + Starlette),
+# which is the same for every target. The load runs inside each app's
+# lifespan, so startup work (pools, cache warm-up, background tasks) is
+# part of the run as it would be under a real server.
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import types
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TARGETS = ["backend_v1.0", "backend_v2.0", "backend_v3.0", "backend"]
+
+CATEGORIES = [
+    "Pizza", "Burger", "Roll", "Rice", "Karahi", "BBQ", "Curry", "Appetizer", "Fries",
+    "Drink", "Dessert", "Sandwich", "Omelette", "Paratha", "Tea", "Coffee", "Salad"
+]
+WORDS = [
+    "Spicy", "Hot", "Mild", "Regular", "Cheesy", "Cheese", "Sweet", "Grilled", "Grill",
+    "Chicken", "Beef", "Mutton", "Veggie", "Special", "Classic", "Biryani", "Handi",
+    "Soup", "Brownie", "Cake", "Low Fat", "Light", "Medium", "Family", "Nuts"
+]
+MOODS = ["spicy_craving", "cheesy_mood", "sweet_craving", "healthy_choice", "heavy_meal", "light_meal", "happy"]
+SPICES = ["low", "medium", "high"]
+BUDGETS = ["tight", "medium", "comfortable"]
+MEAL_TIMES = ["breakfast", "lunch", "dinner"]
+AVOIDS = ["nuts", "beef", "cheese", "none"]
+
+
+# ---------------------------------------------------------------- data
+
+def generate_menu(branches, items, rng):
+    menu = {}
+    now = datetime.datetime(2025, 1, 1)
+    for branch in range(1, branches + 1):
+        rows = []
+        for i in range(items):
+            name = " ".join(rng.sample(WORDS, rng.randint(1, 3))) + f" {rng.choice(CATEGORIES)} {i}"
+            rows.append({
+                "id": branch * 100000 + i,
+                "branch": branch,
+                "name": name,
+                "category": rng.choice(CATEGORIES),
+                "portion": rng.choice(["Single", "Medium", "Large", "Family"]),
+                "price": rng.randint(4, 60) * 25,
+                "updated_at": now
+            })
+        # category and portion are nullable in sql/schema.sql
+        rows[-1]["category"] = rows[-1]["portion"] = None
+        menu[branch] = rows
+    return menu
+
+
+def generate_orders(menu, orders, days, rng):
+    # -> {branch: Counter((item_name, days_ago))}; item popularity is skewed
+    per_branch = max(1, orders // max(1, len(menu)))
+    history = {}
+    for branch, rows in menu.items():
+        names = [r["name"] for r in rows]
+        weights = [1.0 / (i + 1) for i in range(len(names))]
+        picks = rng.choices(names, weights=weights, k=per_branch)
+        history[branch] = Counter((name, rng.randrange(days)) for name in picks)
+    return history
+
+
+def generate_questions(n, rng):
+    questions = []
+    for _ in range(n):
+        questions.append({
+            "peoples": rng.randint(1, 8),
+            "mood": rng.choice(MOODS),
+            "spice_lvl": rng.choice(SPICES),
+            "avoid_anything": rng.choice(AVOIDS),
+            "budget": rng.choice(BUDGETS),
+            "meal_time": rng.choice(MEAL_TIMES)
+        })
+    return questions
+
+
+# ---------------------------------------------------------------- fakes
+
+class FakeMySQL:
+
+    def __init__(self, menu, history, latency, row_cost):
+        self.menu = menu
+        self.history = history
+        self.latency = latency
+        self.row_cost = row_cost
+        self.queries = Counter()
+        self.started = datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(hours=1)
+
+    def order_counts(self, branch, days=None):
+        counts = Counter()
+        for (name, days_ago), n in self.history.get(branch, {}).items():
+            if days is None or days_ago < days:
+                counts[name] += n
+        return counts
+
+    async def execute(self, sql, args):
+        sql = " ".join(sql.split())
+        scanned = 0
+        columns, rows = ["1"], [(1,)]
+
+        if "MAX(updated_at)" in sql:
+            self.queries["menu_versions"] += 1
+            columns = ["branch", "updated_at", "items", "now"]
+            rows = [(branch, self.started, len(rows), datetime.datetime.now()) for branch, rows in sorted(self.menu.items())]
+        elif "FROM menu" in sql and "WHERE branch" not in sql:
+            self.queries["all_menus"] += 1
+            columns = [c.strip() for c in sql[len("SELECT "):sql.index(" FROM")].split(",")]
+            rows = [tuple(r[c] for c in columns) for branch in sorted(self.menu) for r in self.menu[branch]]
+            scanned = len(rows)
+        elif "FROM menu" in sql:
+            self.queries["menu"] += 1
+            branch_rows = self.menu.get(int(args[0]), [])
+            scanned = len(branch_rows)
+            if sql.startswith("SELECT *"):
+                columns = list(branch_rows[0]) if branch_rows else []
+            else:
+                columns = ["name", "category", "portion", "price"]
+            rows = [tuple(r[c] for c in columns) for r in branch_rows]
+        elif "FROM order_item_daily" in sql:
+            self.queries["popularity_rollup"] += 1
+            branch, days = int(args[0]), int(args[1])
+            counts = self.order_counts(branch, days)
+            scanned = len(counts) * days
+            columns, rows = ["item_name", "cnt"], list(counts.items())
+        elif "FROM orders" in sql:
+            self.queries["popularity_orders"] += 1
+            branch = int(args[0])
+            days = int(args[1]) if len(args) > 1 else None
+            counts = self.order_counts(branch, days)
+            scanned = sum(self.history.get(branch, {}).values())
+            columns, rows = ["item_name", "cnt"], list(counts.items())
+        elif not sql.startswith("SELECT 1"):
+            self.queries["other"] += 1
+            rows = []
+
+        await asyncio.sleep(self.latency + scanned * self.row_cost)
+        return columns, rows
+
+
+class FakeCursor:
+
+    def __init__(self, db, as_dict):
+        self.db = db
+        self.as_dict = as_dict
+        self.rows = []
+
+    async def execute(self, sql, args=()):
+        columns, rows = await self.db.execute(sql, args)
+        self.rows = [dict(zip(columns, r)) for r in rows] if self.as_dict else rows
+
+    async def executemany(self, sql, seq):
+        await self.db.execute(sql, ())
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+        self.last_usage = asyncio.get_running_loop().time()
+
+    def cursor(self, cursor_cls=None):
+        import aiomysql
+        return FakeCursor(self.db, cursor_cls is aiomysql.DictCursor)
+
+    async def ping(self, reconnect=True):
+        pass
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakeAcquire:
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __await__(self):
+        return self.pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self.conn = await self.pool._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        self.pool.release(self.conn)
+        return False
+
+
+class FakePool:
+
+    def __init__(self, db, minsize=1, maxsize=10):
+        self.db = db
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self._free = []
+        self._used = 0
+        self._slots = asyncio.Semaphore(maxsize)
+
+    @property
+    def size(self):
+        return len(self._free) + self._used
+
+    @property
+    def freesize(self):
+        return len(self._free)
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+    async def _acquire(self):
+        await self._slots.acquire()
+        self._used += 1
+        return self._free.pop() if self._free else FakeConnection(self.db)
+
+    def release(self, conn):
+        self._used -= 1
+        self._free.append(conn)
+        self._slots.release()
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        await asyncio.sleep(self.redis.latency)
+        return [await getattr(self.redis, "_" + name)(*a, **kw) for name, a, kw in self.ops]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePubSub:
+    # Never delivers: the benchmark process is the only publisher, and the
+    # backends skip their own invalidations anyway
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def listen(self):
+        await asyncio.Event().wait()
+        yield
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeRedis:
+    # Subset of redis.asyncio.Redis used by the backends; expiry is ignored.
+    # Every client shares one keyspace, like connections to one server
+    latency = 0.0
+    data = {}
+    zsets = {}
+    commands = Counter()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def _call(self, name, *args, **kwargs):
+        self.commands[name] += 1
+        await asyncio.sleep(self.latency)
+        return await getattr(self, "_" + name)(*args, **kwargs)
+
+    async def get(self, key):
+        return await self._call("get", key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        return await self._call("set", key, value, ex=ex, nx=nx)
+
+    async def hgetall(self, key):
+        return await self._call("hgetall", key)
+
+    async def delete(self, *keys):
+        return await self._call("delete", *keys)
+
+    async def publish(self, channel, message):
+        return await self._call("publish", channel, message)
+
+    async def mget(self, keys):
+        return await self._call("mget", keys)
+
+    async def ping(self):
+        return await self._call("ping")
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        return await self._call("eval", script, numkeys, *keys_and_args)
+
+    def pipeline(self, transaction=True):
+        self.commands["pipeline"] += 1
+        return FakePipeline(self)
+
+    def pubsub(self):
+        return FakePubSub()
+
+    async def _get(self, key):
+        return self.data.get(key)
+
+    async def _mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    async def _set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def _delete(self, *keys):
+        return sum(self.data.pop(k, None) is not None for k in keys)
+
+    async def _eval(self, script, numkeys, key, token):
+        # the only script the backends run: release a lock if still held
+        if self.data.get(key) == token:
+            return await self._delete(key)
+        return 0
+
+    async def _hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def _hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def _hdel(self, key, *fields):
+        return sum(self.data.get(key, {}).pop(f, None) is not None for f in fields)
+
+    async def _publish(self, channel, message):
+        return 0
+
+    async def _ping(self):
+        return True
+
+    async def _expire(self, key, seconds):
+        return True
+
+    async def _zincrby(self, key, amount, member):
+        zset = self.zsets.setdefault(key, Counter())
+        zset[member] += amount
+        return zset[member]
+
+
+MENU_ROW = re.compile(r"^(?P<name>[^|]+)\|(?P<category>[^|]*)\|(?P<portion>[^|]*)\|(?P<price>\d+)")
+
+
+class FakeGroq:
+    # AsyncGroq stand-in: answers with the first three menu rows of the prompt
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+        self.calls = 0
+
+    async def close(self):
+        pass
+
+    async def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        picks = []
+        for line in messages[-1]["content"].splitlines():
+            m = MENU_ROW.match(line.strip())
+            if m and len(picks) < 3:
+                picks.append({**m.groupdict(), "price": int(m["price"]), "reason": "benchmark"})
+        content = json.dumps({"suggestions": picks})
+        await asyncio.sleep(self.latency)
+
+        if not stream:
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+                usage=None
+            )
+        return FakeStream(content)
+
+
+class FakeStream:
+
+    def __init__(self, content, size=32):
+        self.parts = [content[i:i + size] for i in range(0, len(content), size)]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.parts:
+            raise StopAsyncIteration
+        delta = types.SimpleNamespace(content=self.parts.pop(0))
+        finish_reason = None if self.parts else "stop"
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+    async def close(self):
+        pass
+
+
+# ---------------------------------------------------------------- harness
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(samples, scale):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean": round(sum(samples) / len(samples) * scale, 3) if samples else 0.0,
+        "p50": round(percentile(samples, 50) * scale, 3),
+        "p95": round(percentile(samples, 95) * scale, 3),
+        "p99": round(percentile(samples, 99) * scale, 3)
+    }
+
+
+def micro(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, 1e6)     # microseconds
+
+
+def install_target(target, args, menu, history):
+    # Env first: the backends read it at import time (load_dotenv won't override)
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ.setdefault("MYSQL_HOST", "fake")
+    os.environ.setdefault("MYSQL_PORT", "3306")
+    os.environ.setdefault("MYSQL_USER", "bench")
+    os.environ.setdefault("MYSQL_PASSWORD", "bench")
+    os.environ.setdefault("MYSQL_DB", "bench")
+    os.environ["GROQ_BASE_URL"] = ""
+
+    import aiomysql
+    import redis.asyncio
+    import groq
+
+    db = FakeMySQL(menu, history, args.db_latency_ms / 1000, args.db_row_cost_us / 1e6)
+
+    async def create_pool(minsize=1, maxsize=10, **kwargs):
+        return FakePool(db, minsize, maxsize)
+
+    aiomysql.create_pool = create_pool
+    FakeRedis.latency = args.redis_latency_ms / 1000
+    redis.asyncio.Redis = FakeRedis
+    FakeGroq.latency = args.llm_latency_ms / 1000
+    groq.AsyncGroq = FakeGroq
+
+    sys.path.insert(0, os.path.join(ROOT, target))
+    import main
+    return main.app, db
+
+
+def micro_benchmarks(target, menu, history, questions, repeat):
+    rows = menu[1]
+    popularity = {name: n for (name, _), n in history[1].items()}
+    q = questions[0]
+    results = {}
+
+    if target == "backend_v3.0":
+        import recommend_local as rl
+        from menu_index import MenuIndex
+        from scoring_numpy import score_items, best_by_category
+        from deal_optimizer import best_deals
+
+        index = MenuIndex(rows)
+        question = rl.Question(**q)
+        _, ideal, hard = rl.get_budget_range(q["peoples"], q["budget"], q["mood"])
+        priority = rl.MEAL_PRIORITY.get(q["meal_time"], rl.DEFAULT_PRIORITY)
+        best = best_by_category(index, q["mood"], q["spice_lvl"], q["avoid_anything"], popularity)
+        scores, allowed = score_items(index, q["mood"], q["spice_lvl"], q["avoid_anything"], popularity)
+
+        results["get_budget_range"] = micro(lambda: rl.get_budget_range(q["peoples"], q["budget"], q["mood"]), repeat)
+        results["build_menu_index"] = micro(lambda: MenuIndex(rows), max(1, repeat // 10))
+        results["scoring"] = micro(lambda: best_by_category(index, q["mood"], q["spice_lvl"], q["avoid_anything"], popularity), repeat)
+        results["build_deal_greedy_x3"] = micro(lambda: [rl.build_deal(best, q["peoples"], ideal, hard, priority, shift=s) for s in (0, 2, 4)], repeat)
+        results["best_deals_knapsack"] = micro(lambda: best_deals(index, scores, allowed, q["peoples"], ideal, hard, priority), repeat)
+        results["build_response"] = micro(lambda: rl.build_response(1, question, index, popularity), repeat)
+
+        # cached menu payloads: decode + index build, as on a Redis read
+        from local_cache import freeze_menu
+        from menu_codec import decode_menu, encode_binary, encode_json
+        # rows with NULL strings are only ever written as JSON (see
+        # encode_menu), so both codecs get the rows binary can hold
+        frozen = freeze_menu([r for r in rows if r["category"] is not None and r["portion"] is not None])
+        payloads = {
+            "json": encode_json(frozen, time.time()).encode(),
+            "binary": encode_binary(frozen, time.time(), MenuIndex(frozen))
+        }
+
+        def decode(payload):
+            menu, _, index = decode_menu(payload)
+            return index or MenuIndex(menu)
+
+        for codec, payload in payloads.items():
+            results[f"menu_decode_{codec}"] = micro(lambda: decode(payload), max(1, repeat // 10))
+            results[f"menu_decode_{codec}"]["payload_bytes"] = len(payload)
+
+    elif target == "backend_v2.0":
+        import recommend_local as rl
+
+        def score():
+            scored = []
+            for item in rows:
+                if q["avoid_anything"].lower() in item["name"].lower():
+                    continue
+                scored.append({
+                    "name": item["name"], "category": item["category"],
+                    "portion": item["portion"], "price": item["price"],
+                    "score": rl.mood_match(item["name"], q["mood"]) * 2
+                    + rl.spice_match(item["name"], q["spice_lvl"]) * 3
+                    + popularity.get(item["name"], 0)
+                })
+            return sorted(scored, key=lambda x: x["score"], reverse=True)
+
+        scored = score()
+        _, ideal, hard = rl.get_budget_range(q["peoples"], q["budget"])
+        results["get_budget_range"] = micro(lambda: rl.get_budget_range(q["peoples"], q["budget"]), repeat)
+        results["scoring"] = micro(score, repeat)
+        results["build_deal_greedy_x3"] = micro(lambda: [rl.build_deal(scored, q["peoples"], ideal, hard, priority_shift=s) for s in (0, 2, 4)], repeat)
+
+    elif target == "backend_v1.0":
+        import recommend_local as rl
+
+        def score():
+            scored = []
+            for item in rows:
+                if q["avoid_anything"].lower() in item["name"].lower():
+                    continue
+                scored.append((
+                    rl.spice_match(item["name"], q["spice_lvl"]) * 3
+                    + rl.budget_match(item["price"], q["budget"]) * 3
+                    + rl.mood_match(item["name"], q["mood"]) * 2
+                    + popularity.get(item["name"], 0),
+                    item
+                ))
+            return sorted(scored, key=lambda x: x[0], reverse=True)
+
+        results["budget_match"] = micro(lambda: rl.budget_match(500, q["budget"]), repeat)
+        results["scoring"] = micro(score, repeat)
+
+    elif target == "backend":
+        import local_scorer as ls
+        import recommend_groq as rg
+
+        question = rg.Question(**{k: v for k, v in q.items() if k in rg.Question.model_fields})
+        index = ls.MenuPromptIndex(rows)
+        results["get_budget_range"] = micro(lambda: ls.get_budget_range(q["peoples"], q["budget"], q["mood"]), repeat)
+        results["shortlist"] = micro(lambda: ls.shortlist(index, question, popularity), repeat)
+        results["build_prompt"] = micro(
+            lambda: rg.build_prompt(rows, popularity, question, 1, ls.shortlist(index, question, popularity)), repeat
+        )
+
+    return results
+
+
+async def load_test(app, args, questions, rng):
+    import httpx
+
+    payloads = [
+        {"branch": rng.randint(1, args.branches), "question": rng.choice(questions)}
+        for _ in range(args.warmup + args.requests)
+    ]
+    latencies = []
+    errors = Counter()
+    queue = asyncio.Queue()
+    for p in payloads[args.warmup:]:
+        queue.put_nowait(p)
+
+    # Startup and shutdown as under a real server: pools, cache warm-up,
+    # background tasks (menu watcher, compute pool) for backends that have them
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+            for p in payloads[:args.warmup]:
+                await client.post("/api/recommend", json=p)
+
+            if args.scaling_worker:
+                # wait until every worker of the run is warm (see run_scaling)
+                print("ready", flush=True)
+                sys.stdin.readline()
+
+            async def worker():
+                while True:
+                    try:
+                        p = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        resp = await client.post("/api/recommend", json=p)
+                        if resp.status_code != 200:
+                            errors[str(resp.status_code)] += 1
+                    except Exception as e:
+                        errors[type(e).__name__] += 1
+                    latencies.append(time.perf_counter() - start)
+
+            started_at = time.time()
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+
+    if args.scaling_worker:
+        return {
+            "started_at": started_at,
+            "finished_at": started_at + elapsed,
+            "latencies": latencies,
+            "errors": dict(errors)
+        }
+    return {
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": summarize(latencies, 1e3),
+        "errors": dict(errors)
+    }
+
+
+def run_target(args):
+    rng = random.Random(args.seed)
+    menu = generate_menu(args.branches, args.items, rng)
+    history = generate_orders(menu, args.orders, args.days, rng)
+    questions = generate_questions(args.distinct_questions, rng)
+
+    app, db = install_target(args.target, args, menu, history)
+    if args.scaling_worker:
+        return asyncio.run(load_test(app, args, questions, rng))
+    result = {
+        "target": args.target,
+        "config": {k: v for k, v in vars(args).items() if k not in ("target", "output")},
+        "micro_us": micro_benchmarks(args.target, menu, history, questions, args.micro_repeat),
+        "load": asyncio.run(load_test(app, args, questions, rng)),
+    }
+    result["db_queries"] = dict(db.queries)
+    return result
+
+
+def run_all(argv):
+    results = []
+    for target in TARGETS:
+        cmd = [sys.executable, os.path.abspath(__file__), *argv, "--target", target]
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+        if proc.returncode != 0:
+            results.append({"target": target, "error": proc.stderr.strip().splitlines()[-1:]})
+        else:
+            results.append(json.loads(proc.stdout))
+    return {"results": results}
+
+
+# Throughput with 1, 2, ... worker processes, like gunicorn workers: each
+# is a separate interpreter with its own app, caches and fakes (nothing
+# shared), all warmed up first and then started together. The total
+# request count and concurrency are split evenly between them, so rows
+# only differ in how many cores serve the same load
+def run_scaling(args, argv):
+    rows = []
+    for n in [int(w) for w in args.workers.split(",")]:
+        cmd = [
+            sys.executable, os.path.abspath(__file__), *argv,
+            "--target", args.target,
+            "--requests", str(args.requests // n),
+            "--concurrency", str(max(1, args.concurrency // n)),
+            "--scaling-worker"
+        ]
+        procs = [
+            subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=ROOT)
+            for _ in range(n)
+        ]
+        for proc in procs:
+            if proc.stdout.readline().strip() != "ready":
+                raise RuntimeError(f"scaling worker exited with {proc.wait()}")
+        for proc in procs:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+        results = [json.loads(proc.communicate()[0]) for proc in procs]
+
+        latencies = [t for r in results for t in r["latencies"]]
+        errors = Counter()
+        for r in results:
+            errors.update(r["errors"])
+        elapsed = max(r["finished_at"] for r in results) - min(r["started_at"] for r in results)
+        rows.append({
+            "workers": n,
+            "requests": len(latencies),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": summarize(latencies, 1e3),
+            "errors": dict(errors)
+        })
+
+    for row in rows:
+        row["speedup"] = round(row["throughput_rps"] / rows[0]["throughput_rps"], 2) if rows[0]["throughput_rps"] else None
+    return {"target": args.target, "cpus": os.cpu_count(), "scaling": rows}
+
+
+# sys.argv without the given options (and their values)
+def forward_argv(drop):
+    argv, skip = [], False
+    for a in sys.argv[1:]:
+        if skip:
+            skip = False
+        elif a in drop:
+            skip = True
+        elif not a.startswith(tuple(f"{name}=" for name in drop)):
+            argv.append(a)
+    return argv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommend backends in-process")
+    parser.add_argument("--target", default="backend_v3.0", choices=TARGETS + ["all"])
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--items", type=int, default=200, help="menu items per branch")
+    parser.add_argument("--orders", type=int, default=200000, help="orders across all branches")
+    parser.add_argument("--days", type=int, default=90, help="days of order history")
+    parser.add_argument("--distinct-questions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--micro-repeat", type=int, default=500)
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    parser.add_argument("--db-row-cost-us", type=float, default=0.05)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.2)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument(
+        "--workers",
+        help="comma-separated worker process counts, e.g. 1,2,4: measure throughput scaling instead"
+    )
+    parser.add_argument("--scaling-worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workers:
+        if args.target == "all":
+            parser.error("--workers needs a single --target")
+        argv = forward_argv(("--target", "--output", "--workers", "--requests", "--concurrency"))
+        result = run_scaling(args, argv)
+    elif args.target == "all":
+        # Targets share module names (main, recommend_local, ...), so each
+        # runs in its own interpreter with the same options
+        result = run_all(forward_argv(("--target", "--output")))
+    else:
+        result = run_target(args)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()